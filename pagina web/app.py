@@ -1,7 +1,21 @@
-from flask import Flask, render_template, request, redirect, session, url_for, jsonify
+from flask import Flask, render_template, request, redirect, session, url_for, jsonify, g, has_request_context, abort
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
-import oracledb
+import time
+import threading
+import hashlib
+import atexit
+import random
+import click
+from datetime import datetime, timedelta
+from collections import OrderedDict
+from functools import wraps
+from contextlib import contextmanager
+from instantanea import InstantaneaCatalogo, InstantaneaNoDisponible
+from asistente import IndiceProductos, interpretar
+from migrar import aplicar_migraciones, crear_bd_local
+from bd import BackendOracle, BackendSQLite, ConexionVigilada
+from perfilador import Perfilador
 from dotenv import load_dotenv
 import smtplib
 from email.message import EmailMessage
@@ -14,14 +28,92 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY")
 
-# Evitar cache del navegador (para que "Atrás" no muestre páginas viejas)
+# --- Política de caché HTTP por ruta ---
+# Por defecto nada se guarda (para que "Atrás" no muestre páginas viejas).
+# Las rutas de datos pueden marcarse con @politica_cache("revalidar"): el navegador
+# guarda la respuesta pero pregunta siempre con If-None-Match, y si el catálogo no
+# cambió contestamos 304 sin tocar la BD.
+POLITICAS_CACHE = {
+    "no-store": "no-store, no-cache, must-revalidate, max-age=0",
+    "revalidar": "private, no-cache",
+}
+
+
+def politica_cache(nombre):
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            g.politica_cache = nombre
+            return vista(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
 @app.after_request
 def no_cache(response):
-    response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
+    politica = g.get("politica_cache", "no-store")
+    response.headers["Cache-Control"] = POLITICAS_CACHE[politica]
+    if politica == "no-store":
+        response.headers["Pragma"] = "no-cache"
+        response.headers["Expires"] = "0"
     return response
 
+
+# Versión del catálogo: sube con cada escritura de productos y forma parte de los ETag.
+# El token del proceso invalida los ETag viejos al reiniciar la app. La versión solo ve
+# las escrituras de este proceso: lo que cambie por fuera (otro worker, un DBA, `flask
+# sembrar`) se recoge porque los ETag además caducan cada ETAG_VIGENCIA segundos.
+ETAG_VIGENCIA = float(os.environ.get("ETAG_VIGENCIA", "60"))
+_catalogo_version = 0
+_catalogo_lock = threading.Lock()
+_catalogo_token = format(int(time.time()), "x")
+
+
+def notificar_cambio_catalogo(idproducto=None):
+    """
+    Llamar después de cada commit que modifique PRODUCTO, con el id si se conoce
+    (también en los INSERT: ver backend_bd.insertar). Sin id se fuerza una copia
+    completa; queda para cargas masivas. Solo avisa a este proceso.
+    """
+    global _catalogo_version
+    with _catalogo_lock:
+        _catalogo_version += 1
+    if catalogo_local:
+        catalogo_local.marcar_cambio(idproducto)
+    indice_productos.marcar_cambio(idproducto)
+
+
+def etag_catalogo(*partes):
+    clave = "|".join(str(p) for p in partes)
+    resumen = hashlib.sha1(clave.encode("utf-8")).hexdigest()[:12]
+    ventana = int(time.time() // ETAG_VIGENCIA) if ETAG_VIGENCIA > 0 else 0
+    return f"{_catalogo_token}-{_catalogo_version}.{ventana:x}-{resumen}"
+
+
+def poner_etag(resp, etag):
+    """
+    ETag para revalidar, salvo en respuestas degradadas: esas no se guardan, así al
+    volver la BD el cliente recibe datos frescos en vez de un 304 de la copia vieja.
+    """
+    if g.get("modo_degradado"):
+        g.politica_cache = "no-store"
+    else:
+        resp.set_etag(etag, weak=True)
+    return resp
+
+
+def respuesta_no_modificada(etag):
+    """Devuelve un 304 si el cliente ya tiene esta versión; si no, None."""
+    if request.if_none_match.contains_weak(etag):
+        resp = app.response_class(status=304)
+        resp.set_etag(etag, weak=True)
+        return resp
+    return None
+
+
+# --- Backend de BD: 'oracle' (Oracle Cloud) o 'sqlite' (archivo local para desarrollo y benchmarks) ---
+DB_BACKEND = os.environ.get("DB_BACKEND", "oracle")
+
 # --- Configuración de Conexión a Oracle Cloud ---
 DB_USER = os.environ.get("DB_USER")
 DB_PASSWORD = os.environ.get("DB_PASSWORD")
@@ -34,53 +126,384 @@ GMAIL_SMTP_PORT = int(os.environ.get("GMAIL_SMTP_PORT", "587"))
 GMAIL_USER = os.environ.get("GMAIL_USER")
 GMAIL_PASSWORD = os.environ.get("GMAIL_PASSWORD")
 
+# --- Pool de conexiones y sondas de salud ---
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", "8"))
+HEALTH_CACHE_TTL = float(os.environ.get("HEALTH_CACHE_TTL", "5"))
+SMTP_PROBE_TTL = float(os.environ.get("SMTP_PROBE_TTL", "60"))
+SMTP_PROBE_TIMEOUT = float(os.environ.get("SMTP_PROBE_TIMEOUT", "5"))
+READYZ_ESPERA = float(os.environ.get("READYZ_ESPERA", "2"))   # segundos que /readyz espera a una sonda
+
+# --- Límite de tasa y control de admisión ---
+# Cupos simultáneos para rutas que usan la BD o Gmail, y cuánto se espera por uno
+BULKHEAD_BD = int(os.environ.get("BULKHEAD_BD", str(DB_POOL_MAX)))
+BULKHEAD_SMTP = int(os.environ.get("BULKHEAD_SMTP", "4"))
+BULKHEAD_ESPERA = float(os.environ.get("BULKHEAD_ESPERA", "0.2"))
+
+# --- Timeouts y cortacircuitos ---
+DB_CONNECT_TIMEOUT = float(os.environ.get("DB_CONNECT_TIMEOUT", "10"))     # segundos
+DB_POOL_WAIT_TIMEOUT = int(os.environ.get("DB_POOL_WAIT_TIMEOUT", "3000"))  # ms esperando conexión libre
+DB_CALL_TIMEOUT = int(os.environ.get("DB_CALL_TIMEOUT", "15000"))           # ms por llamada a la BD
+SMTP_TIMEOUT = float(os.environ.get("SMTP_TIMEOUT", "15"))                  # segundos
+CB_FALLOS = int(os.environ.get("CB_FALLOS", "5"))        # fallos seguidos para abrir el circuito
+CB_ESPERA = float(os.environ.get("CB_ESPERA", "30"))     # segundos abierto antes de probar de nuevo
+
+# --- Copia local del catálogo (SQLite) ---
+SNAPSHOT_ACTIVO = os.environ.get("SNAPSHOT_ACTIVO", "1") == "1"
+SNAPSHOT_INTERVALO = float(os.environ.get("SNAPSHOT_INTERVALO", "15"))   # refresco de productos cambiados
+SNAPSHOT_COMPLETO = float(os.environ.get("SNAPSHOT_COMPLETO", "600"))    # copia completa
+# 'respaldo': solo se lee la copia si Oracle falla o el pool está lleno
+# 'preferir': la copia actúa como réplica de lectura mientras esté al día
+SNAPSHOT_LECTURAS = os.environ.get("SNAPSHOT_LECTURAS", "respaldo")
+
+# --- Perfilador de SQL ---
+PERFIL_SQL = os.environ.get("PERFIL_SQL", "0") == "1"
+SQL_LENTO_MS = float(os.environ.get("SQL_LENTO_MS", "200"))
+SQL_EXPLAIN = os.environ.get("SQL_EXPLAIN", "0") == "1"     # planes de las lentas (hilo aparte)
+
+# --- Chatbot ---
+CHAT_MAX_RESULTADOS = int(os.environ.get("CHAT_MAX_RESULTADOS", "20"))
+CHAT_INDICE_COMPLETO = float(os.environ.get("CHAT_INDICE_COMPLETO", "600"))  # recarga completa del índice (0 = nunca)
+CHAT_LOG_LOTE = int(os.environ.get("CHAT_LOG_LOTE", "50"))              # filas por executemany
+CHAT_LOG_INTERVALO = float(os.environ.get("CHAT_LOG_INTERVALO", "5"))   # segundos entre volcados
+CHAT_LOG_MAX_PENDIENTES = int(os.environ.get("CHAT_LOG_MAX_PENDIENTES", "10000"))
+
+# --- Historial y retención de correos ---
+CORREO_RETENCION_DIAS = int(os.environ.get("CORREO_RETENCION_DIAS", "180"))
+CORREO_ARCHIVO_LOTE = int(os.environ.get("CORREO_ARCHIVO_LOTE", "500"))
+CORREO_ARCHIVO_INTERVALO = float(os.environ.get("CORREO_ARCHIVO_INTERVALO", "86400"))  # segundos (0 = solo por CLI)
+
+# --- Borrado lógico y purga de productos ---
+PRODUCTO_PURGA_DIAS = int(os.environ.get("PRODUCTO_PURGA_DIAS", "30"))        # días en la papelera antes de borrar
+PRODUCTO_PURGA_LOTE = int(os.environ.get("PRODUCTO_PURGA_LOTE", "200"))
+PRODUCTO_PURGA_HORAS = os.environ.get("PRODUCTO_PURGA_HORAS", "2-5")          # ventana de baja carga (hora local)
+PRODUCTO_PURGA_INTERVALO = float(os.environ.get("PRODUCTO_PURGA_INTERVALO", "1800"))  # segundos (0 = solo por CLI)
+PRODUCTO_PURGA_REINTENTO = float(os.environ.get("PRODUCTO_PURGA_REINTENTO", "86400"))  # segundos sin reintentar uno referenciado
+
+
+def leer_horas_purga(texto):
+    """'2-5' -> (2, 5). Se valida al arrancar: un valor malo no debe matar el hilo de purga en silencio."""
+    try:
+        desde, hasta = (int(h) for h in texto.split("-"))
+    except ValueError:
+        desde = hasta = -1
+    if not (0 <= desde <= 23 and 0 <= hasta <= 23):
+        raise ValueError(f"""
+        ¡ERROR DE CONFIGURACIÓN!
+        PRODUCTO_PURGA_HORAS debe ser 'desde-hasta' con horas de 0 a 23 (p. ej. '2-5'), no {texto!r}
+        """)
+    return desde, hasta
+
+
+PURGA_DESDE, PURGA_HASTA = leer_horas_purga(PRODUCTO_PURGA_HORAS)
+
 # --- CALCULAR RUTA DEL WALLET RELATIVA AL PROYECTO ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 WALLET_DIR = os.path.join(BASE_DIR, "Wallet_LACTEOSDB")
 
-# Verificar que todas las variables estén configuradas
-if not all([DB_USER, DB_PASSWORD, DB_SERVICE_NAME, DB_WALLET_PASSWORD]):
-    raise ValueError("""
-    ¡ERROR DE CONFIGURACIÓN!
-    Debes configurar en .env: DB_USER, DB_PASSWORD, DB_SERVICE_NAME, DB_WALLET_PASSWORD
-    """)
+DB_SQLITE_RUTA = os.environ.get("DB_SQLITE_RUTA", os.path.join(BASE_DIR, "lacteos_local.sqlite3"))
 
-# Verificar si la carpeta del wallet existe
-if not os.path.isdir(WALLET_DIR):
-    raise FileNotFoundError(f"""
-    ¡ERROR: La carpeta del Wallet no se encuentra!
-    Se esperaba en: {WALLET_DIR}
-    """)
+if DB_BACKEND == "oracle":
+    # Verificar que todas las variables estén configuradas
+    if not all([DB_USER, DB_PASSWORD, DB_SERVICE_NAME, DB_WALLET_PASSWORD]):
+        raise ValueError("""
+        ¡ERROR DE CONFIGURACIÓN!
+        Debes configurar en .env: DB_USER, DB_PASSWORD, DB_SERVICE_NAME, DB_WALLET_PASSWORD
+        """)
+
+    # Verificar si la carpeta del wallet existe
+    if not os.path.isdir(WALLET_DIR):
+        raise FileNotFoundError(f"""
+        ¡ERROR: La carpeta del Wallet no se encuentra!
+        Se esperaba en: {WALLET_DIR}
+        """)
+
+    # Limpiar posibles influencias de Oracle local
+    if "ORACLE_HOME" in os.environ:
+        del os.environ["ORACLE_HOME"]
+    if "TNS_ADMIN" in os.environ:
+        del os.environ["TNS_ADMIN"]
+
+    # Forzar TNS_ADMIN para que el driver sepa dónde buscar el tnsnames.ora
+    os.environ["TNS_ADMIN"] = WALLET_DIR
+elif DB_BACKEND != "sqlite":
+    raise ValueError(f"DB_BACKEND debe ser 'oracle' o 'sqlite', no '{DB_BACKEND}'")
+
+SNAPSHOT_RUTA = os.environ.get("SNAPSHOT_RUTA", os.path.join(BASE_DIR, "catalogo_local.sqlite3"))
 
-# Limpiar posibles influencias de Oracle local
-if "ORACLE_HOME" in os.environ:
-    del os.environ["ORACLE_HOME"]
-if "TNS_ADMIN" in os.environ:
-    del os.environ["TNS_ADMIN"]
 
-# Forzar TNS_ADMIN para que el driver sepa dónde buscar el tnsnames.ora
-os.environ["TNS_ADMIN"] = WALLET_DIR
+# --- Cortacircuitos ---
+class CircuitoAbierto(RuntimeError):
+    """Se lanza sin intentar la operación cuando el backend está marcado como caído."""
+
+
+class Cortacircuitos:
+    """
+    Cortacircuitos simple por backend:
+      - 'cerrado'     -> todo pasa; CB_FALLOS fallos seguidos lo abren
+      - 'abierto'     -> falla al instante durante CB_ESPERA segundos
+      - 'semiabierto' -> deja pasar una sola prueba; si sale bien se cierra, si no se vuelve a abrir
+    """
+
+    def __init__(self, nombre, fallos_max=CB_FALLOS, espera=CB_ESPERA):
+        self.nombre = nombre
+        self.fallos_max = fallos_max
+        self.espera = espera
+        self.estado = "cerrado"
+        self.fallos = 0
+        self.abierto_desde = 0.0
+        self.prueba_desde = 0.0
+        self.ultimo_error = None
+        self._lock = threading.Lock()
+
+    def antes(self):
+        with self._lock:
+            ahora = time.monotonic()
+            if self.estado == "abierto":
+                if ahora - self.abierto_desde < self.espera:
+                    raise CircuitoAbierto(f"{self.nombre} no disponible (circuito abierto)")
+                self.estado = "semiabierto"
+                self.prueba_desde = ahora
+                return
+            if self.estado == "semiabierto":
+                # Ya hay una prueba en curso; si nunca informó (p. ej. no llegó a ejecutar nada)
+                # pasado `espera` se deja salir otra
+                if ahora - self.prueba_desde < self.espera:
+                    raise CircuitoAbierto(f"{self.nombre} no disponible (probando recuperación)")
+                self.prueba_desde = ahora
+
+    def exito(self):
+        with self._lock:
+            self.estado = "cerrado"
+            self.fallos = 0
+
+    def fallo(self, error):
+        with self._lock:
+            self.fallos += 1
+            self.ultimo_error = str(error)
+            if self.estado == "semiabierto" or self.fallos >= self.fallos_max:
+                self.estado = "abierto"
+                self.abierto_desde = time.monotonic()
+
+    def resumen(self):
+        return {"estado": self.estado, "fallos": self.fallos, "ultimo_error": self.ultimo_error}
+
+
+circuito_bd = Cortacircuitos("Base de datos")
+circuito_smtp = Cortacircuitos("Servidor de correo")
 
 
 # --- Conexión a la BD ---
+if DB_BACKEND == "sqlite":
+    backend_bd = BackendSQLite(DB_SQLITE_RUTA)
+    # La BD local se crea (o se pone al día) con las mismas migraciones que Oracle
+    crear_bd_local(DB_SQLITE_RUTA)[0].close()
+else:
+    backend_bd = BackendOracle(
+        DB_USER, DB_PASSWORD, DB_SERVICE_NAME, WALLET_DIR, DB_WALLET_PASSWORD,
+        minimo=DB_POOL_MIN,
+        maximo=DB_POOL_MAX,
+        connect_timeout=DB_CONNECT_TIMEOUT,
+        wait_timeout=DB_POOL_WAIT_TIMEOUT,
+        call_timeout=DB_CALL_TIMEOUT
+    )
+
+# Excepciones del backend activo (para los except de las rutas)
+ErrorBD = backend_bd.Error
+IntegridadBD = backend_bd.IntegrityError
+
+
+def _medicion_sql(medicion):
+    # Acumula las sentencias de la petición en curso para el resumen en modo debug
+    if has_request_context():
+        g.setdefault("sql_mediciones", []).append(medicion)
+
+
+perfilador_sql = Perfilador(
+    umbral_ms=SQL_LENTO_MS,
+    explicar=backend_bd.explicar if SQL_EXPLAIN else None,
+    al_medir=_medicion_sql
+) if PERFIL_SQL else None
+
+
+def _vigilar_bd(error):
+    """
+    Resultado de cada execute/fetch/commit para el cortacircuitos. Tomar una conexión
+    del pool no prueba nada (suele volver una sesión abierta sin hablar con la BD).
+    Errores de la BD que sí respondió (p. ej. clave duplicada) cuentan como éxito.
+    """
+    if error is None or not backend_bd.es_caida(error):
+        circuito_bd.exito()
+    else:
+        circuito_bd.fallo(error)
+
+
 def get_db_connection():
+    circuito_bd.antes()
     try:
-        conn = oracledb.connect(
-            user=DB_USER,
-            password=DB_PASSWORD,
-            dsn=DB_SERVICE_NAME,
-            config_dir=WALLET_DIR,
-            wallet_location=WALLET_DIR,
-            wallet_password=DB_WALLET_PASSWORD
-        )
-        return conn
-    except oracledb.DatabaseError as e:
-        error_obj, = e.args
-        print(f"❌ Error de conexión a la BD: Código {error_obj.code}, Mensaje: {error_obj.message}")
+        conn = backend_bd.conectar()
+    except ErrorBD as e:
+        if backend_bd.es_caida(e):
+            circuito_bd.fallo(e)
+        print(f"❌ Error de conexión a la BD: {backend_bd.describir_error(e)}")
+        raise
+    conn = ConexionVigilada(conn, _vigilar_bd)
+    if perfilador_sql:
+        return perfilador_sql.envolver(conn)
+    return conn
+
+
+@app.after_request
+def resumen_sql(response):
+    """En modo debug cada respuesta lleva el resumen de SQL de la petición."""
+    mediciones = g.get("sql_mediciones")
+    if app.debug and mediciones:
+        ms = sum(m["ms"] for m in mediciones)
+        filas = sum(m["filas"] for m in mediciones)
+        viajes = sum(m["viajes"] for m in mediciones)
+        response.headers["Server-Timing"] = f'sql;dur={ms:.2f};desc="{len(mediciones)} sentencias"'
+        response.headers["X-SQL-Resumen"] = f"sentencias={len(mediciones)}; ms={ms:.2f}; filas={filas}; viajes={viajes}"
+        print(f"SQL {request.method} {request.path}: {len(mediciones)} sentencias, {ms:.2f} ms, {filas} filas, {viajes} viajes")
+    return response
+
+
+@app.route('/debug/sql', methods=['GET'])
+def debug_sql():
+    # Solo con app.debug y para administradores: expone el texto de las sentencias y sus planes
+    if not app.debug or not perfilador_sql:
+        abort(404)
+    if 'idusuario' not in session:
+        return jsonify({"ok": False, "error": "No autorizado"}), 401
+    if session.get('categoria') != 'admin':
+        return jsonify({"ok": False, "error": "Solo administradores"}), 403
+    return jsonify(perfilador_sql.resumen(request.args.get('top', 20, type=int)))
+
+
+# --- Modo degradado ---
+# Guardamos la última lectura buena del catálogo y las categorías. Si la BD no
+# responde, las páginas de lectura muestran esa copia (solo lectura) en vez de vacío.
+# Las claves salen de parámetros de la petición: se guardan como LRU con tope.
+MAX_LECTURAS_GUARDADAS = 64
+_ultimas_lecturas = OrderedDict()
+_ultimas_lecturas_lock = threading.Lock()
+
+
+def guardar_lectura(clave, datos):
+    with _ultimas_lecturas_lock:
+        _ultimas_lecturas[clave] = (time.time(), datos)
+        _ultimas_lecturas.move_to_end(clave)
+        while len(_ultimas_lecturas) > MAX_LECTURAS_GUARDADAS:
+            _ultimas_lecturas.popitem(last=False)
+
+
+def lectura_guardada(clave):
+    """Devuelve la última copia de `clave` y marca la petición como degradada, o None."""
+    with _ultimas_lecturas_lock:
+        guardada = _ultimas_lecturas.get(clave)
+        if guardada is not None:
+            _ultimas_lecturas.move_to_end(clave)
+    if guardada is None:
+        return None
+    g.modo_degradado = True
+    return guardada[1]
+
+
+catalogo_local = InstantaneaCatalogo(SNAPSHOT_RUTA, get_db_connection) if SNAPSHOT_ACTIVO else None
+
+
+def _preferir_copia_local():
+    if not catalogo_local.al_dia():
+        return False
+    if SNAPSHOT_LECTURAS == "preferir":
+        return True
+    # Pool lleno: mejor contestar desde la copia que hacer cola por una conexión
+    return backend_bd.saturado()
+
+
+def leer_catalogo(clave, desde_bd, desde_copia, guardar=True):
+    """
+    Lectura del catálogo con respaldo:
+      1. copia local, si está al día y se prefiere (o el pool está lleno)
+      2. Oracle, con cupo en el compartimento "bd" (sin cupo: copia local o 429)
+      3. si Oracle falla: copia local y, si no hay, la última lectura guardada en memoria
+    Con guardar=False no se guarda copia en memoria (lecturas grandes).
+    """
+    if catalogo_local and _preferir_copia_local():
+        try:
+            return desde_copia()
+        except InstantaneaNoDisponible:
+            pass
+
+    try:
+        # El cupo del compartimento "bd" se toma solo si de verdad se va a la BD
+        with en_compartimento("bd"):
+            datos = desde_bd()
+    except CompartimentoLleno:
+        # Sin cupo para la BD: igual que con el pool lleno, vale la copia local
+        if catalogo_local:
+            try:
+                return desde_copia()
+            except InstantaneaNoDisponible:
+                pass
         raise
+    except (ErrorBD, CircuitoAbierto):
+        if catalogo_local:
+            try:
+                datos = desde_copia()
+                g.modo_degradado = True
+                return datos
+            except InstantaneaNoDisponible:
+                pass
+        datos = lectura_guardada(clave)
+        if datos is None:
+            raise
+        return datos
+    if guardar:
+        guardar_lectura(clave, datos)
+    return datos
+
+
+# --- Tareas en segundo plano ---
+_tareas_iniciadas = False
+
+
+@app.before_request
+def iniciar_tareas_fondo():
+    # Se arrancan con la primera petición para no duplicar hilos con el recargador de Flask
+    global _tareas_iniciadas
+    if _tareas_iniciadas:
+        return
+    _tareas_iniciadas = True
+    if catalogo_local:
+        catalogo_local.iniciar(SNAPSHOT_INTERVALO, SNAPSHOT_COMPLETO)
+    threading.Thread(target=_bucle_bitacora_chat, name="bitacora-chat", daemon=True).start()
+    if CORREO_ARCHIVO_INTERVALO > 0:
+        threading.Thread(target=_bucle_archivo_correos, name="archivo-correos", daemon=True).start()
+    if PRODUCTO_PURGA_INTERVALO > 0:
+        threading.Thread(target=_bucle_purga_productos, name="purga-productos", daemon=True).start()
+    lanzar_recarga_indice()
+    if CHAT_INDICE_COMPLETO > 0:
+        threading.Thread(target=_bucle_indice_chat, name="indice-chatbot-periodico", daemon=True).start()
 
 
 # --- Helper para enviar correo con Gmail ---
+def es_caida_smtp(error):
+    """
+    True si el error dice que el servidor no está disponible: conexión, timeout o una
+    respuesta 4xx (temporal). Un destinatario o mensaje rechazado es problema de ese
+    correo y no debe abrir el circuito para todos.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return False
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError)  # socket: rechazo, red caída, timeout
+
+
 def enviar_correo_gmail(destino, asunto, cuerpo_texto, cuerpo_html=None):
     """Envía correo con texto plano y opcionalmente HTML (UTF-8)."""
     host = os.environ.get("GMAIL_SMTP_HOST")
@@ -103,10 +526,336 @@ def enviar_correo_gmail(destino, asunto, cuerpo_texto, cuerpo_html=None):
     if cuerpo_html:
         msg.add_alternative(cuerpo_html, subtype="html", charset="utf-8")
 
-    with smtplib.SMTP(host, port) as server:
-        server.starttls()
-        server.login(user, password)
-        server.send_message(msg)
+    circuito_smtp.antes()
+    try:
+        with smtplib.SMTP(host, port, timeout=SMTP_TIMEOUT) as server:
+            server.starttls()
+            server.login(user, password)
+            server.send_message(msg)
+    except Exception as e:
+        if es_caida_smtp(e):
+            circuito_smtp.fallo(e)
+            registrar_estado_smtp(False, str(e))
+        else:
+            # El servidor contestó: para el circuito cuenta como que está arriba
+            circuito_smtp.exito()
+        raise
+    circuito_smtp.exito()
+    registrar_estado_smtp(True)
+
+
+# --- Salud y diagnóstico ---
+# Las sondas guardan su último resultado unos segundos para que el balanceador
+# pueda consultar /healthz y /readyz muy seguido sin tocar Oracle ni Gmail.
+_inicio_proceso = time.time()
+_sondas_cache = {}
+_sondas_en_curso = {}
+_sondas_lock = threading.Lock()
+
+
+def _correr_sonda(nombre, funcion, listo):
+    try:
+        resultado = funcion()
+    except Exception as e:
+        resultado = {"ok": False, "error": str(e)}
+    resultado["instante"] = time.time()
+    with _sondas_lock:
+        _sondas_cache[nombre] = resultado
+        del _sondas_en_curso[nombre]
+    listo.set()
+
+
+def _sonda_con_cache(nombre, ttl, funcion, espera=None):
+    """
+    Devuelve el resultado de la sonda si tiene menos de `ttl` segundos; si no, la ejecuta.
+    Solo corre una sonda de cada tipo a la vez (las demás peticiones esperan la misma) y,
+    con `espera`, se da por caída si no contesta en ese tiempo (la sonda sigue en su hilo).
+    """
+    with _sondas_lock:
+        previo = _sondas_cache.get(nombre)
+        if previo and time.time() - previo["instante"] < ttl:
+            return previo
+        listo = _sondas_en_curso.get(nombre)
+        if listo is None:
+            listo = _sondas_en_curso[nombre] = threading.Event()
+            threading.Thread(target=_correr_sonda, args=(nombre, funcion, listo),
+                             name=f"sonda-{nombre}", daemon=True).start()
+    if not listo.wait(espera):
+        return {"ok": False, "error": f"La sonda no respondió en {espera} s", "instante": time.time()}
+    with _sondas_lock:
+        return _sondas_cache[nombre]
+
+
+def registrar_estado_smtp(ok, error=None):
+    """Un envío real también sirve como sonda de SMTP."""
+    with _sondas_lock:
+        _sondas_cache["smtp"] = {"ok": ok, "error": error, "origen": "envio", "instante": time.time()}
+
+
+def estado_pool():
+    return backend_bd.estado()
+
+
+def sondear_bd():
+    """Hace SELECT 1 FROM DUAL con una conexión del pool y mide la ida y vuelta."""
+    inicio = time.perf_counter()
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM DUAL")
+        cursor.fetchone()
+        cursor.close()
+        conn.close()
+        return {"ok": True, "latencia_ms": round((time.perf_counter() - inicio) * 1000, 2)}
+    except Exception as e:
+        return {"ok": False, "error": str(e), "latencia_ms": round((time.perf_counter() - inicio) * 1000, 2)}
+
+
+def sondear_smtp():
+    """Comprueba que el servidor SMTP responde al saludo (sin autenticar ni enviar)."""
+    host = os.environ.get("GMAIL_SMTP_HOST", GMAIL_SMTP_HOST)
+    port = int(os.environ.get("GMAIL_SMTP_PORT", GMAIL_SMTP_PORT))
+    inicio = time.perf_counter()
+    try:
+        with smtplib.SMTP(host, port, timeout=SMTP_PROBE_TIMEOUT) as server:
+            server.ehlo()
+        return {"ok": True, "origen": "sonda", "latencia_ms": round((time.perf_counter() - inicio) * 1000, 2)}
+    except Exception as e:
+        return {"ok": False, "origen": "sonda", "error": str(e)}
+
+
+def estado_caches():
+    """Estado de las cachés en memoria del proceso."""
+    with _sondas_lock:
+        sondas = {nombre: round(time.time() - r["instante"], 1) for nombre, r in _sondas_cache.items()}
+    with _ultimas_lecturas_lock:
+        lecturas = {str(clave): round(time.time() - instante, 1) for clave, (instante, _) in _ultimas_lecturas.items()}
+    return {
+        "sondas_salud": {"edad_segundos": sondas},
+        "ultimas_lecturas": {"edad_segundos": lecturas},
+        "catalogo_local": catalogo_local.resumen() if catalogo_local else None,
+        "indice_chatbot": indice_productos.resumen(),
+        "bitacora_chat": {"pendientes": len(_bitacora_chat), "descartadas": _bitacora_chat_descartadas},
+    }
+
+
+def hay_lectura_de_respaldo():
+    """True si, sin BD, todavía se puede servir el catálogo en modo degradado."""
+    if catalogo_local and catalogo_local.lista:
+        return True
+    with _ultimas_lecturas_lock:
+        return bool(_ultimas_lecturas)
+
+
+def estado_listo(usar_cache=True):
+    """
+    Arma el reporte de /readyz. Listo = la BD responde o, si no, hay de dónde servir el
+    catálogo de solo lectura (copia local o última lectura guardada). Así el balanceador
+    no saca a todas las instancias cuando cae Oracle: es mejor el modo degradado que un error.
+    """
+    if usar_cache:
+        bd = _sonda_con_cache("bd", HEALTH_CACHE_TTL, sondear_bd, READYZ_ESPERA)
+        smtp = _sonda_con_cache("smtp", SMTP_PROBE_TTL, sondear_smtp, READYZ_ESPERA)
+    else:
+        bd = sondear_bd()
+        smtp = sondear_smtp()
+    degradado = not bd["ok"] and hay_lectura_de_respaldo()
+    return {
+        "ok": bd["ok"] or degradado,
+        "degradado": degradado,
+        "bd": bd,
+        "pool": estado_pool(),
+        "smtp": smtp,
+        "admision": estado_admision(),
+        "circuitos": {"bd": circuito_bd.resumen(), "smtp": circuito_smtp.resumen()},
+        "caches": estado_caches(),
+    }
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Solo indica que el proceso está vivo: no hace I/O
+    return jsonify({"ok": True, "uptime_segundos": round(time.time() - _inicio_proceso, 1)})
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    estado = estado_listo()
+    codigo = 200 if estado["ok"] else 503
+    # El detalle (errores, pool, cachés) solo para administradores; el balanceador ve arriba/abajo
+    if session.get('categoria') == 'admin':
+        return jsonify(estado), codigo
+    return jsonify({
+        "ok": estado["ok"],
+        "degradado": estado["degradado"],
+        "bd": "arriba" if estado["bd"]["ok"] else "abajo",
+        "smtp": "arriba" if estado["smtp"]["ok"] else "abajo",
+    }), codigo
+
+
+@app.cli.command("diagnostico")
+def diagnostico():
+    """Diagnóstico de conexión a Oracle Cloud y Gmail (flask --app app diagnostico)."""
+    print("Usando TNS_ADMIN:", os.environ.get("TNS_ADMIN"))
+    print(f"Intentando conectar como usuario: {DB_USER} al servicio: {DB_SERVICE_NAME}")
+
+    estado = estado_listo(usar_cache=False)
+
+    if estado["bd"]["ok"]:
+        print(f"✅ CONEXIÓN EXITOSA A ORACLE CLOUD ({estado['bd']['latencia_ms']} ms)")
+    else:
+        print("❌ Error de conexión a la BD:", estado["bd"]["error"])
+    print("Pool:", estado["pool"])
+
+    if estado["smtp"]["ok"]:
+        print(f"✅ SMTP responde ({estado['smtp']['latencia_ms']} ms)")
+    else:
+        print("❌ SMTP no responde:", estado["smtp"]["error"])
+
+    if not estado["bd"]["ok"]:
+        raise SystemExit(1)
+
+# --- Límite de tasa (token bucket) y compartimentos ---
+# Cada usuario tiene una cubeta por ruta: capacidad = ráfaga permitida, recarga =
+# fichas por segundo. Solo se cobra con sesión: sin sesión la vista contesta 401 sin
+# trabajo, así que no hace falta una cubeta por IP. Los compartimentos limitan cuántas
+# peticiones a la BD o a Gmail corren a la vez; si no hay cupo se responde 429 enseguida.
+# El cupo se toma solo alrededor del bloque que usa ese recurso: mientras se espera a
+# Gmail no se ocupa un cupo de la BD.
+LIMITES_TASA = {
+    "chatbot": (20, 1.0),
+    "chatbot_enviar": (3, 1 / 30),
+    "enviar_producto_correo": (5, 1 / 20),
+    "correo_index": (5, 1 / 20),
+}
+
+MAX_CUBETAS = 10000
+_cubetas = {}
+_cubetas_lock = threading.Lock()
+_compartimentos = {
+    "bd": (threading.BoundedSemaphore(BULKHEAD_BD), BULKHEAD_BD),
+    "smtp": (threading.BoundedSemaphore(BULKHEAD_SMTP), BULKHEAD_SMTP),
+}
+_compartimentos_en_uso = {"bd": 0, "smtp": 0}
+_rechazos = {"tasa": 0, "bd": 0, "smtp": 0}
+_admision_lock = threading.Lock()
+
+
+class CompartimentoLleno(RuntimeError):
+    """No hubo cupo en un compartimento dentro de BULKHEAD_ESPERA; se contesta 429."""
+
+
+@app.errorhandler(CompartimentoLleno)
+def compartimento_lleno(e):
+    return respuesta_sobrecarga("El servidor está ocupado, intenta en unos segundos.", 1)
+
+
+def tomar_fichas(clave, capacidad, recarga, costo=1):
+    """Descuenta `costo` fichas de la cubeta. Devuelve 0 si pasó o los segundos a esperar."""
+    ahora = time.monotonic()
+    with _cubetas_lock:
+        if len(_cubetas) > MAX_CUBETAS:
+            # Las cubetas sin uso hace más de 10 minutos ya estarían llenas: se pueden olvidar
+            for vieja in [k for k, (_, t) in _cubetas.items() if ahora - t > 600]:
+                del _cubetas[vieja]
+        fichas, ultimo = _cubetas.get(clave, (capacidad, ahora))
+        fichas = min(capacidad, fichas + (ahora - ultimo) * recarga)
+        if fichas >= costo:
+            _cubetas[clave] = (fichas - costo, ahora)
+            return 0
+        _cubetas[clave] = (fichas, ahora)
+        return (costo - fichas) / recarga
+
+
+def respuesta_sobrecarga(mensaje, reintentar_en):
+    segundos = max(1, int(reintentar_en + 0.999))
+    if request.is_json or request.path.startswith('/chatbot'):
+        resp = jsonify({"ok": False, "error": mensaje})
+    else:
+        resp = app.response_class(mensaje, mimetype="text/plain")
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(segundos)
+    return resp
+
+
+def cobrar_tasa(ruta, costo=1):
+    """Descuenta `costo` fichas de LIMITES_TASA[ruta] al usuario en sesión. Devuelve la respuesta 429 o None."""
+    capacidad, recarga = LIMITES_TASA[ruta]
+    espera = tomar_fichas((session['idusuario'], ruta), capacidad, recarga, costo)
+    if espera:
+        with _admision_lock:
+            _rechazos["tasa"] += 1
+        return respuesta_sobrecarga("Demasiadas solicitudes, intenta más tarde.", espera)
+    return None
+
+
+def limitar_tasa(ruta, costo=None, metodos=("GET", "POST")):
+    """Aplica LIMITES_TASA[ruta] por usuario. `costo` puede ser una función que mire la petición."""
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            if request.method in metodos and 'idusuario' in session:
+                sobrecarga = cobrar_tasa(ruta, costo() if costo else 1)
+                if sobrecarga:
+                    return sobrecarga
+            return vista(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+@contextmanager
+def en_compartimento(*nombres):
+    """
+    Reserva un cupo en cada compartimento (p. ej. "bd", "smtp") mientras dura el bloque.
+    Lanza CompartimentoLleno si no hay cupo. Dentro de una petición que ya tiene el cupo
+    no se vuelve a tomar; fuera de una petición (hilos de fondo) no se limita.
+    """
+    if not has_request_context():
+        yield
+        return
+    ya_tomados = g.setdefault("compartimentos", set())
+    tomados = []
+    try:
+        for nombre in nombres:
+            if nombre in ya_tomados:
+                continue
+            semaforo, _ = _compartimentos[nombre]
+            if not semaforo.acquire(timeout=BULKHEAD_ESPERA):
+                with _admision_lock:
+                    _rechazos[nombre] += 1
+                raise CompartimentoLleno(nombre)
+            tomados.append(nombre)
+            ya_tomados.add(nombre)
+            with _admision_lock:
+                _compartimentos_en_uso[nombre] += 1
+        yield
+    finally:
+        for nombre in tomados:
+            ya_tomados.discard(nombre)
+            with _admision_lock:
+                _compartimentos_en_uso[nombre] -= 1
+            _compartimentos[nombre][0].release()
+
+
+def estado_admision():
+    with _admision_lock:
+        return {
+            "compartimentos": {
+                nombre: {"en_uso": _compartimentos_en_uso[nombre], "maximo": maximo}
+                for nombre, (_, maximo) in _compartimentos.items()
+            },
+            "rechazos": dict(_rechazos),
+            "cubetas": len(_cubetas),
+        }
+
+
+def _costo_chatbot():
+    # 'todos' recorre el catálogo completo: cuesta más que un filtro o una pregunta libre
+    data = request.args if request.method == 'GET' else (request.get_json(silent=True) or {})
+    if data.get('tipo') in ('activos', 'categoria', 'texto') or data.get('texto'):
+        return 1
+    return 5
+
 
 #CHATBOt
 def obtener_productos_chat(tipo, filtro=None):
@@ -116,7 +865,38 @@ def obtener_productos_chat(tipo, filtro=None):
       - 'todos'   -> todos los productos
       - 'activos' -> solo activos
       - 'categoria' -> por id de categoría (filtro = idcategoria)
+    Si la BD no responde, contesta desde la copia local del catálogo.
     """
+    # Tipos desconocidos se tratan como 'todos' y el filtro solo vale como id de categoría,
+    # así la clave de la lectura guardada no depende de texto arbitrario del usuario
+    try:
+        filtro = int(filtro) if tipo == "categoria" and filtro else None
+    except (TypeError, ValueError):
+        filtro = None
+    if tipo not in ("activos", "categoria") or (tipo == "categoria" and filtro is None):
+        tipo = "todos"
+
+    filas = leer_catalogo(
+        ("chat", tipo, str(filtro)),
+        lambda: _consultar_productos_chat(tipo, filtro),
+        lambda: catalogo_local.productos_chat(tipo, filtro)
+    )
+
+    # Lo convertimos en una lista de diccionarios más cómoda
+    productos = []
+    for row in filas:
+        productos.append({
+            "id": row[0],
+            "nombre": row[1],
+            "descripcion": row[2],
+            "cantidad": row[3],
+            "simbolo": row[4],
+            "categoria": row[5],
+        })
+    return productos
+
+
+def _consultar_productos_chat(tipo, filtro=None):
     conn = get_db_connection()
     cursor = conn.cursor()
 
@@ -131,13 +911,14 @@ def obtener_productos_chat(tipo, filtro=None):
         FROM PRODUCTO P
         JOIN UNIDADMEDIDA U ON P.IDUNIDAD = U.IDUNIDAD
         JOIN CATEGORIAPRODUCTO C ON P.IDCATEGORIA = C.IDCATEGORIA
+        WHERE P.FECHAELIMINACION IS NULL
     """
 
     if tipo == "activos":
-        sql = base_sql + " WHERE P.ACTIVO = 1 ORDER BY P.NOMBRE"
+        sql = base_sql + " AND P.ACTIVO = 1 ORDER BY P.NOMBRE"
         cursor.execute(sql)
     elif tipo == "categoria" and filtro:
-        sql = base_sql + " WHERE P.IDCATEGORIA = :1 ORDER BY P.NOMBRE"
+        sql = base_sql + " AND P.IDCATEGORIA = :1 ORDER BY P.NOMBRE"
         cursor.execute(sql, (filtro,))
     else:  # 'todos' u otro
         sql = base_sql + " ORDER BY P.NOMBRE"
@@ -146,8 +927,149 @@ def obtener_productos_chat(tipo, filtro=None):
     filas = cursor.fetchall()
     cursor.close()
     conn.close()
+    return filas
+def _consultar_categorias():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT IDCATEGORIA, NOMBRE
+        FROM CATEGORIAPRODUCTO
+        ORDER BY NOMBRE
+    """)
+    categorias = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return categorias
+
+
+# --- Preguntas libres: índice de productos en memoria ---
+# Se carga completo al arrancar y luego solo se recargan los productos que
+# notificar_cambio_catalogo() marca, así la mayoría de preguntas no toca la BD.
+# Las recargas completas corren en un hilo y cambian el índice de una vez.
+indice_productos = IndiceProductos()
+_indice_lock = threading.Lock()
+_indice_recarga_lock = threading.Lock()
+
+SQL_INDICE = """
+    SELECT
+        P.IDPRODUCTO,
+        P.NOMBRE,
+        P.DESCRIPCION,
+        P.CANTIDAD,
+        P.ACTIVO,
+        P.IDCATEGORIA,
+        C.NOMBRE,
+        P.IDUNIDAD,
+        U.SIMBOLO
+    FROM PRODUCTO P
+    JOIN UNIDADMEDIDA U ON P.IDUNIDAD = U.IDUNIDAD
+    JOIN CATEGORIAPRODUCTO C ON P.IDCATEGORIA = C.IDCATEGORIA
+    WHERE P.FECHAELIMINACION IS NULL
+"""
 
-    # Lo convertimos en una lista de diccionarios más cómoda
+
+def _consultar_indice(ids=None):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.arraysize = 1000
+    if ids is None:
+        cursor.execute(SQL_INDICE)
+        filas = cursor.fetchall()
+    else:
+        filas = []
+        for i in range(0, len(ids), 500):
+            lote = ids[i:i + 500]
+            marcas = ", ".join(f":{n + 1}" for n in range(len(lote)))
+            cursor.execute(SQL_INDICE + f" AND P.IDPRODUCTO IN ({marcas})", lote)
+            filas.extend(cursor.fetchall())
+    cursor.close()
+    conn.close()
+    return filas
+
+
+def _consultar_unidades():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT IDUNIDAD, NOMBRE, SIMBOLO
+        FROM UNIDADMEDIDA
+        ORDER BY NOMBRE
+    """)
+    unidades = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return unidades
+
+
+def _recargar_indice():
+    indice_productos.iniciar_carga()
+    filas = leer_catalogo(
+        "indice", _consultar_indice, lambda: catalogo_local.productos_indice(), guardar=False
+    )
+    unidades = leer_catalogo("unidades", _consultar_unidades, lambda: catalogo_local.unidades())
+    indice_productos.cargar(filas, leer_categorias(), unidades)
+
+
+def _recargar_indice_fondo():
+    # Se llama con _indice_recarga_lock tomado; lo suelta al terminar
+    try:
+        with app.app_context():
+            _recargar_indice()
+    except Exception as e:
+        indice_productos.marcar_cambio(None)
+        print("Error recargando índice del chatbot (se usa el anterior):", e)
+    finally:
+        _indice_recarga_lock.release()
+
+
+def lanzar_recarga_indice():
+    """Recarga completa en segundo plano (una a la vez). Devuelve False si ya había una."""
+    if not _indice_recarga_lock.acquire(blocking=False):
+        return False
+    threading.Thread(target=_recargar_indice_fondo, name="indice-chatbot", daemon=True).start()
+    return True
+
+
+def _bucle_indice_chat():
+    # marcar_cambio solo ve las escrituras de este proceso: la recarga completa periódica
+    # recoge lo que cambió por fuera (otros workers, la BD directamente, `flask sembrar`)
+    while True:
+        time.sleep(CHAT_INDICE_COMPLETO)
+        if _indice_recarga_lock.acquire(blocking=False):
+            _recargar_indice_fondo()
+
+
+def asegurar_indice():
+    """
+    Aplica los cambios pendientes al índice. Solo la primera carga se espera dentro de
+    la petición; una recarga completa se lanza en un hilo y mientras tanto se usa el
+    índice actual. Si falla la actualización por ids, se sigue con el anterior.
+    """
+    if not indice_productos.cargado:
+        with _indice_recarga_lock:  # si la carga inicial ya corre en su hilo, se espera a esa
+            if not indice_productos.cargado:
+                _recargar_indice()
+
+    completo, ids = indice_productos.tomar_pendientes()
+    if completo and not lanzar_recarga_indice():
+        # Ya hay una recarga en curso que pudo leer antes de este cambio: otra después
+        indice_productos.marcar_cambio(None)
+    if not ids:
+        return
+    with _indice_lock:
+        try:
+            indice_productos.actualizar(_consultar_indice(ids), ids)
+        except Exception as e:
+            for idproducto in ids:
+                indice_productos.marcar_cambio(idproducto)
+            print("Error actualizando índice del chatbot (se usa el anterior):", e)
+
+
+def buscar_productos_texto(texto):
+    """Interpreta una pregunta libre y la contesta desde el índice. Devuelve (filtros, productos, total)."""
+    asegurar_indice()
+    filtros = interpretar(texto, indice_productos.categorias, indice_productos.unidades)
+    filas, total = indice_productos.buscar(filtros, CHAT_MAX_RESULTADOS)
     productos = []
     for row in filas:
         productos.append({
@@ -155,10 +1077,25 @@ def obtener_productos_chat(tipo, filtro=None):
             "nombre": row[1],
             "descripcion": row[2],
             "cantidad": row[3],
-            "simbolo": row[4],
-            "categoria": row[5],
+            "simbolo": row[8],
+            "categoria": row[6],
         })
-    return productos
+    return filtros, productos, total
+
+
+def resolver_consulta_chat(tipo, filtro=None, texto=None):
+    """Productos para una consulta del chatbot: pregunta libre (tipo 'texto') o tipo fijo."""
+    if tipo == 'texto' or (texto and not tipo):
+        filtros, productos, total = buscar_productos_texto(texto or "")
+        return productos, total, filtros["intencion"]
+    productos = obtener_productos_chat(tipo, filtro)
+    return productos, len(productos), "listar"
+
+
+def leer_categorias():
+    return leer_catalogo("categorias", _consultar_categorias, lambda: catalogo_local.categorias())
+
+
 @app.route('/chat', methods=['GET'])
 def chat():
     if 'idusuario' not in session:
@@ -166,16 +1103,7 @@ def chat():
 
     # Traemos categorías para usarlas en el combo del chat
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT IDCATEGORIA, NOMBRE
-            FROM CATEGORIAPRODUCTO
-            ORDER BY NOMBRE
-        """)
-        categorias = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        categorias = leer_categorias()
     except Exception as e:
         print("Error listando categorías para chat:", e)
         categorias = []
@@ -183,19 +1111,67 @@ def chat():
     return render_template(
         'chat.html',
         nombre=session.get('nombre'),
-        categorias=categorias
+        categorias=categorias,
+        modo_degradado=g.get("modo_degradado", False)
     )
-@app.route('/chatbot', methods=['POST'])
+@app.route('/categorias', methods=['GET'])
+@politica_cache("revalidar")
+def categorias_json():
+    if 'idusuario' not in session:
+        return jsonify({"ok": False, "error": "No autorizado"}), 401
+
+    etag = etag_catalogo("categorias")
+    no_modificada = respuesta_no_modificada(etag)
+    if no_modificada:
+        return no_modificada
+
+    try:
+        filas = leer_categorias()
+    except CompartimentoLleno:
+        raise
+    except Exception as e:
+        print("Error listando categorías:", e)
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+    categorias = [{"id": row[0], "nombre": row[1]} for row in filas]
+    resp = jsonify({"ok": True, "categorias": categorias, "degradado": g.get("modo_degradado", False)})
+    return poner_etag(resp, etag)
+
+
+@app.route('/chatbot', methods=['GET', 'POST'])
+@politica_cache("revalidar")
 def chatbot():
     if 'idusuario' not in session:
         return jsonify({"ok": False, "error": "No autorizado"}), 401
 
-    data = request.get_json() or {}
-    tipo = data.get('tipo')           # 'todos', 'activos', 'categoria'
+    # GET permite que el navegador revalide con ETag; POST se mantiene por compatibilidad
+    data = request.args if request.method == 'GET' else (request.get_json() or {})
+    tipo = data.get('tipo')           # 'todos', 'activos', 'categoria', 'texto'
     filtro = data.get('filtro')       # idcategoria (opcional)
+    texto = data.get('texto')         # pregunta libre (tipo 'texto')
+
+    # Sesión y ETag antes de cobrar: un 304 cuesta una ficha y no ocupa cupo de BD;
+    # el compartimento "bd" lo toma leer_catalogo() solo si la lectura va a la BD.
+    inicio = time.perf_counter()
+    etag = etag_catalogo("chatbot", tipo, filtro, texto)
+    no_modificada = respuesta_no_modificada(etag)
+    sobrecarga = cobrar_tasa("chatbot", 1 if no_modificada else _costo_chatbot())
+    if sobrecarga:
+        return sobrecarga
+    if no_modificada:
+        # También cuenta como consulta para la bitácora (la más repetida suele llegar así)
+        registrar_turno_chat(
+            session['idusuario'], tipo, filtro, texto,
+            (time.perf_counter() - inicio) * 1000, None, revalidada=True
+        )
+        return no_modificada
 
     try:
-        productos = obtener_productos_chat(tipo, filtro)
+        productos, total, intencion = resolver_consulta_chat(tipo, filtro, texto)
+        registrar_turno_chat(
+            session['idusuario'], tipo, filtro, texto,
+            (time.perf_counter() - inicio) * 1000, total
+        )
 
         if not productos:
             respuesta = "No encontré productos para esa consulta."
@@ -203,19 +1179,159 @@ def chatbot():
             # Armamos una respuesta tipo texto
             lineas = []
             for p in productos:
-                linea = f"- {p['nombre']}: {p['descripcion']} ({p['cantidad']} {p['simbolo']}, categoría: {p['categoria']})"
+                if intencion == "cantidad":
+                    linea = f"- {p['nombre']}: hay {p['cantidad']} {p['simbolo']} (categoría: {p['categoria']})"
+                else:
+                    linea = f"- {p['nombre']}: {p['descripcion']} ({p['cantidad']} {p['simbolo']}, categoría: {p['categoria']})"
                 lineas.append(linea)
+            if total > len(productos):
+                lineas.append(f"... y {total - len(productos)} más. Puedes afinar la pregunta.")
             respuesta = "\n".join(lineas)
 
-        return jsonify({
+        resp = jsonify({
             "ok": True,
             "respuesta": respuesta,
+            "degradado": g.get("modo_degradado", False),
         })
+        return poner_etag(resp, etag)
 
+    except CompartimentoLleno:
+        raise
     except Exception as e:
         print("Error en chatbot:", e)
         return jsonify({"ok": False, "error": str(e)}), 500
+# --- Bitácora de consultas del chatbot ---
+# Los turnos se acumulan en memoria y un hilo los inserta con executemany cada
+# CHAT_LOG_LOTE filas o CHAT_LOG_INTERVALO segundos, fuera del camino de la petición.
+_bitacora_chat = []
+_bitacora_chat_lock = threading.Lock()
+_bitacora_chat_evento = threading.Event()
+_bitacora_chat_descartadas = 0
+
+
+def registrar_turno_chat(idusuario, tipo, filtro, texto, latencia_ms, resultados, revalidada=False):
+    """Anota un turno; `revalidada` = contestado con 304 (resultados desconocidos)."""
+    with _bitacora_chat_lock:
+        _bitacora_chat.append((
+            idusuario,
+            (tipo or "")[:20] or None,
+            str(filtro)[:100] if filtro is not None else None,
+            (texto or "")[:500] or None,
+            round(latencia_ms, 2),
+            resultados,
+            1 if revalidada else 0,
+        ))
+        lleno = len(_bitacora_chat) >= CHAT_LOG_LOTE
+    if lleno:
+        _bitacora_chat_evento.set()
+
+
+def volcar_bitacora_chat():
+    """Inserta lo acumulado. Si la BD falla, las filas vuelven al buffer (con tope)."""
+    global _bitacora_chat, _bitacora_chat_descartadas
+    with _bitacora_chat_lock:
+        filas, _bitacora_chat = _bitacora_chat, []
+    if not filas:
+        return 0
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.executemany("""
+            INSERT INTO CHATBOTCONSULTA (IDUSUARIO, TIPO, FILTRO, TEXTO, LATENCIAMS, RESULTADOS, REVALIDADA, FECHA)
+            VALUES (:1, :2, :3, :4, :5, :6, :7, SYSTIMESTAMP)
+        """, filas)
+        conn.commit()
+        cursor.close()
+        conn.close()
+        return len(filas)
+    except Exception:
+        with _bitacora_chat_lock:
+            _bitacora_chat = filas + _bitacora_chat
+            sobrantes = len(_bitacora_chat) - CHAT_LOG_MAX_PENDIENTES
+            if sobrantes > 0:
+                # Se pierden las más viejas antes que dejar crecer la memoria sin límite
+                del _bitacora_chat[:sobrantes]
+                _bitacora_chat_descartadas += sobrantes
+        raise
+
+
+def _bucle_bitacora_chat():
+    while True:
+        _bitacora_chat_evento.wait(CHAT_LOG_INTERVALO)
+        _bitacora_chat_evento.clear()
+        try:
+            volcar_bitacora_chat()
+        except Exception as e:
+            print("Error guardando bitácora del chatbot:", e)
+
+
+def _volcar_bitacora_al_salir():
+    try:
+        volcar_bitacora_chat()
+    except Exception as e:
+        print("No se pudo guardar la bitácora del chatbot al salir:", e)
+
+
+atexit.register(_volcar_bitacora_al_salir)
+
+
+@app.route('/chatbot/historial', methods=['GET'])
+def chatbot_historial():
+    """Historial del usuario, del más nuevo al más viejo. ?antes=<idconsulta> pide la página siguiente."""
+    if 'idusuario' not in session:
+        return jsonify({"ok": False, "error": "No autorizado"}), 401
+
+    limite = min(max(request.args.get('limite', 20, type=int), 1), 100)
+    antes = request.args.get('antes') or None
+    if antes is not None:
+        # Un cursor roto no debe confundirse con "primera página"
+        try:
+            antes = int(antes)
+        except ValueError:
+            return jsonify({"ok": False, "error": "Cursor 'antes' inválido"}), 400
+
+    sql = """
+        SELECT IDCONSULTA, TIPO, FILTRO, TEXTO, LATENCIAMS, RESULTADOS, FECHA, REVALIDADA
+        FROM CHATBOTCONSULTA
+        WHERE IDUSUARIO = :1
+    """
+    params = [session['idusuario']]
+    if antes is not None:
+        sql += " AND IDCONSULTA < :2"
+        params.append(antes)
+    sql += f" ORDER BY IDCONSULTA DESC FETCH FIRST {limite} ROWS ONLY"
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        filas = cursor.fetchall()
+        cursor.close()
+        conn.close()
+    except Exception as e:
+        print("Error leyendo historial del chatbot:", e)
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+    consultas = [{
+        "id": row[0],
+        "tipo": row[1],
+        "filtro": row[2],
+        "texto": row[3],
+        "latencia_ms": float(row[4]) if row[4] is not None else None,
+        "resultados": row[5],
+        "fecha": row[6].isoformat() if row[6] else None,
+        "revalidada": row[7] == 1,
+    } for row in filas]
+
+    return jsonify({
+        "ok": True,
+        "consultas": consultas,
+        "siguiente": consultas[-1]["id"] if len(consultas) == limite else None,
+    })
+
+
 @app.route('/chatbot/enviar', methods=['POST'])
+@limitar_tasa("chatbot_enviar")
 def chatbot_enviar():
     if 'idusuario' not in session:
         return jsonify({"ok": False, "error": "No autorizado"}), 401
@@ -224,10 +1340,11 @@ def chatbot_enviar():
     tipo = data.get('tipo')
     filtro = data.get('filtro')
     mensaje_usuario = data.get('mensaje_usuario', '')  # texto que escribió el usuario en el chat
+    texto = (data.get('texto') or mensaje_usuario) if tipo == 'texto' else None
 
     try:
         # 1) Obtenemos los productos igual que en la respuesta del bot
-        productos = obtener_productos_chat(tipo, filtro)
+        productos, _, _ = resolver_consulta_chat(tipo, filtro, texto)
 
         if not productos:
             return jsonify({"ok": False, "error": "No hay productos para enviar."})
@@ -262,12 +1379,13 @@ Enviado desde el Sistema Lácteos.
         """
 
         # 3) Buscamos el correo del usuario logueado
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT EMAIL FROM USUARIO WHERE IDUSUARIO = :1", (session['idusuario'],))
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with en_compartimento("bd"):
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT EMAIL FROM USUARIO WHERE IDUSUARIO = :1", (session['idusuario'],))
+            row = cursor.fetchone()
+            cursor.close()
+            conn.close()
 
         if not row or not row[0]:
             return jsonify({"ok": False, "error": "No se encontró el correo del usuario."})
@@ -275,11 +1393,14 @@ Enviado desde el Sistema Lácteos.
         email_destino = row[0]
         asunto = "Resultado de tu consulta en el chatbot - Sistema Lácteos"
 
-        # 4) Enviamos correo
-        enviar_correo_gmail(email_destino, asunto, cuerpo_texto, cuerpo_html)
+        # 4) Enviamos correo (sin cupo de BD: un Gmail lento no debe frenar las lecturas)
+        with en_compartimento("smtp"):
+            enviar_correo_gmail(email_destino, asunto, cuerpo_texto, cuerpo_html)
 
         return jsonify({"ok": True})
 
+    except CompartimentoLleno:
+        raise
     except Exception as e:
         print("Error enviando correo desde chatbot:", e)
         return jsonify({"ok": False, "error": str(e)}), 500
@@ -292,6 +1413,54 @@ def home():
     return render_template('index.html')
 
 
+def _consultar_dashboard():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    # Productos + unidad de medida
+    cursor.execute("""
+        SELECT 
+            P.IDPRODUCTO,      -- 0
+            P.NOMBRE,          -- 1
+            P.DESCRIPCION,     -- 2
+            P.ACTIVO,          -- 3
+            P.CANTIDAD,        -- 4
+            U.NOMBRE,          -- 5 nombre unidad
+            U.SIMBOLO,         -- 6 símbolo unidad
+            P.IDUNIDAD         -- 7 idunidad
+        FROM PRODUCTO P
+        JOIN UNIDADMEDIDA U
+            ON P.IDUNIDAD = U.IDUNIDAD
+        WHERE P.FECHAELIMINACION IS NULL
+        ORDER BY P.IDPRODUCTO
+    """)
+    productos = cursor.fetchall()
+
+    # Categorías
+    cursor.execute("""
+        SELECT IDCATEGORIA, NOMBRE
+        FROM CATEGORIAPRODUCTO
+        ORDER BY NOMBRE
+    """)
+    categorias = cursor.fetchall()
+
+    # Unidades (para los selects)
+    cursor.execute("""
+        SELECT IDUNIDAD, NOMBRE, SIMBOLO
+        FROM UNIDADMEDIDA
+        ORDER BY NOMBRE
+    """)
+    unidades = cursor.fetchall()
+
+    cursor.close()
+    conn.close()
+    return productos, categorias, unidades
+
+
+def _copia_dashboard():
+    return catalogo_local.productos_dashboard(), catalogo_local.categorias(), catalogo_local.unidades()
+
+
 # Dashboard de usuario
 @app.route('/user')
 def user():
@@ -299,47 +1468,10 @@ def user():
         return redirect(url_for('login'))
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Productos + unidad de medida
-        cursor.execute("""
-            SELECT 
-                P.IDPRODUCTO,      -- 0
-                P.NOMBRE,          -- 1
-                P.DESCRIPCION,     -- 2
-                P.ACTIVO,          -- 3
-                P.CANTIDAD,        -- 4
-                U.NOMBRE,          -- 5 nombre unidad
-                U.SIMBOLO,         -- 6 símbolo unidad
-                P.IDUNIDAD         -- 7 idunidad
-            FROM PRODUCTO P
-            JOIN UNIDADMEDIDA U
-                ON P.IDUNIDAD = U.IDUNIDAD
-            ORDER BY P.IDPRODUCTO
-        """)
-        productos = cursor.fetchall()
-
-        # Categorías
-        cursor.execute("""
-            SELECT IDCATEGORIA, NOMBRE
-            FROM CATEGORIAPRODUCTO
-            ORDER BY NOMBRE
-        """)
-        categorias = cursor.fetchall()
-
-        # Unidades (para los selects)
-        cursor.execute("""
-            SELECT IDUNIDAD, NOMBRE, SIMBOLO
-            FROM UNIDADMEDIDA
-            ORDER BY NOMBRE
-        """)
-        unidades = cursor.fetchall()
-
-        cursor.close()
-        conn.close()
-
-    except oracledb.Error as e:
+        productos, categorias, unidades = leer_catalogo("dashboard", _consultar_dashboard, _copia_dashboard)
+    except CompartimentoLleno:
+        raise
+    except ErrorBD as e:
         print("Error Oracle al listar datos:", e)
         productos = []
         categorias = []
@@ -355,7 +1487,8 @@ def user():
         productos=productos,
         categorias=categorias,
         unidades=unidades,
-        nombre=session.get('nombre')
+        nombre=session.get('nombre'),
+        modo_degradado=g.get("modo_degradado", False)
     )
 
 
@@ -387,9 +1520,9 @@ def register():
 
             return render_template('register.html', mensaje="Usuario registrado exitosamente ✅")
 
-        except oracledb.IntegrityError:
+        except IntegridadBD:
             return render_template('register.html', error="El correo ya está registrado")
-        except oracledb.Error as e:
+        except ErrorBD as e:
             print("Error Oracle en registro:", e)
             return render_template('register.html', error=f"Error al registrar usuario: {e}")
         except Exception as e:
@@ -415,15 +1548,17 @@ def admin():
             idcategoria = request.form.get('idcategoria')
             idunidad = request.form.get('idunidad')
 
-            cursor.execute("""
+            idproducto = backend_bd.insertar(cursor, """
                 INSERT INTO PRODUCTO (NOMBRE, DESCRIPCION, IDCATEGORIA, IDUNIDAD, ACTIVO, IDUSUARIOCREADOR)
                 VALUES (:1, :2, :3, :4, 1, :5)
-            """, (nombre, descripcion, idcategoria, idunidad, session['idusuario']))
+            """, (nombre, descripcion, idcategoria, idunidad, session['idusuario']), "IDPRODUCTO")
             conn.commit()
+            notificar_cambio_catalogo(idproducto)
 
         cursor.execute("""
             SELECT IDPRODUCTO, NOMBRE, DESCRIPCION, ACTIVO
             FROM PRODUCTO
+            WHERE FECHAELIMINACION IS NULL
             ORDER BY IDPRODUCTO
         """)
         productos = cursor.fetchall()
@@ -431,7 +1566,7 @@ def admin():
         conn.close()
 
         return render_template('admin_temp.html', productos=productos)
-    except oracledb.Error as e:
+    except ErrorBD as e:
         print("Error Oracle en admin:", e)
         return f"Error en la sección de administración: {e}"
     except Exception as e:
@@ -439,6 +1574,133 @@ def admin():
         return f"Error inesperado en administración: {e}"
 
 
+# --- Borrado lógico de productos ---
+# Eliminar solo marca FECHAELIMINACION: es un UPDATE corto que no choca con filas que
+# referencian al producto. purgar_productos() hace el DELETE real más tarde, por lotes.
+MAX_ELIMINAR_LOTE = 1000
+
+
+def es_id(valor):
+    """True solo para enteros de verdad (1.5, "3" o True no son ids)."""
+    return isinstance(valor, int) and not isinstance(valor, bool) and valor > 0
+
+
+def eliminar_productos(ids):
+    """Marca como eliminados los productos `ids`. Devuelve cuántos marcó."""
+    ids = list(ids)
+    if not all(es_id(i) for i in ids):
+        raise ValueError("Los ids de producto deben ser enteros positivos")
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    marcados = 0
+    try:
+        for i in range(0, len(ids), 500):
+            lote = ids[i:i + 500]
+            marcas = ", ".join(f":{n + 1}" for n in range(len(lote)))
+            cursor.execute(f"""
+                UPDATE PRODUCTO
+                SET FECHAELIMINACION = SYSTIMESTAMP
+                WHERE IDPRODUCTO IN ({marcas}) AND FECHAELIMINACION IS NULL
+            """, lote)
+            marcados += cursor.rowcount
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    for idproducto in ids:
+        notificar_cambio_catalogo(idproducto)
+    return marcados
+
+
+# Productos que la purga no pudo borrar porque otra fila los referencia: se saltan
+# hasta que pase PRODUCTO_PURGA_REINTENTO en vez de reintentarlos uno a uno cada vez
+_no_purgables = {}
+
+
+def purgar_productos(dias=None, lote=None, seguir=None):
+    """
+    Borra de verdad los productos eliminados hace más de `dias` días, de a `lote`
+    filas con commit por lote. Si un lote choca con una FK se borra fila por fila y
+    las que siguen referenciadas quedan en la papelera (y se saltan por un tiempo).
+    `seguir()` se consulta antes de cada lote; si devuelve False se corta ahí.
+    Devuelve cuántas borró.
+    """
+    dias = PRODUCTO_PURGA_DIAS if dias is None else dias
+    lote = min(PRODUCTO_PURGA_LOTE if lote is None else lote, 1000)
+    corte = datetime.now() - timedelta(days=dias)
+    borradas = 0
+    ultimo = 0
+    ahora = time.monotonic()
+    for idproducto in [i for i, t in _no_purgables.items() if ahora - t >= PRODUCTO_PURGA_REINTENTO]:
+        del _no_purgables[idproducto]
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        while True:
+            if seguir is not None and not seguir():
+                break
+            cursor.setinputsizes(corte=backend_bd.TIMESTAMP)
+            cursor.execute(f"""
+                SELECT IDPRODUCTO FROM PRODUCTO
+                WHERE FECHAELIMINACION < :corte AND IDPRODUCTO > :ultimo
+                ORDER BY IDPRODUCTO
+                FETCH FIRST {int(lote)} ROWS ONLY
+            """, {"corte": corte, "ultimo": ultimo})
+            leidos = [row[0] for row in cursor.fetchall()]
+            if not leidos:
+                break
+            ultimo = leidos[-1]
+            ids = [i for i in leidos if i not in _no_purgables]
+
+            marcas = ", ".join(f":{n + 1}" for n in range(len(ids)))
+            try:
+                if ids:
+                    cursor.execute(f"DELETE FROM PRODUCTO WHERE IDPRODUCTO IN ({marcas})", ids)
+                    borradas += cursor.rowcount
+                    conn.commit()
+            except IntegridadBD:
+                conn.rollback()
+                for idproducto in ids:
+                    try:
+                        cursor.execute("DELETE FROM PRODUCTO WHERE IDPRODUCTO = :1", (idproducto,))
+                        borradas += cursor.rowcount
+                        conn.commit()
+                    except IntegridadBD:
+                        conn.rollback()
+                        _no_purgables[idproducto] = time.monotonic()
+
+            if len(leidos) < lote:
+                break
+            time.sleep(0.1)  # deja respirar a las escrituras normales entre lotes
+    finally:
+        cursor.close()
+        conn.close()
+    return borradas
+
+
+def en_horas_de_purga(ahora=None):
+    """True si la hora local cae en PRODUCTO_PURGA_HORAS ('2-5' = de 2:00 a 5:59; '22-4' cruza la medianoche)."""
+    hora = (ahora or datetime.now()).hour
+    if PURGA_DESDE <= PURGA_HASTA:
+        return PURGA_DESDE <= hora <= PURGA_HASTA
+    return hora >= PURGA_DESDE or hora <= PURGA_HASTA
+
+
+def _bucle_purga_productos():
+    while True:
+        time.sleep(PRODUCTO_PURGA_INTERVALO)
+        if not en_horas_de_purga():
+            continue
+        try:
+            # La ventana se revisa también entre lotes: una purga larga no se sale de ella
+            borradas = purgar_productos(seguir=en_horas_de_purga)
+            if borradas:
+                print(f"Purga de productos: {borradas} filas eliminadas definitivamente")
+        except Exception as e:
+            print("Error en la purga de productos:", e)
+
+
 # Eliminar producto (admin)
 @app.route('/delete', methods=['POST'])
 def delete():
@@ -446,17 +1708,11 @@ def delete():
         return redirect(url_for('login'))
 
     try:
-        idproducto = request.form.get('idproducto')
-
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM PRODUCTO WHERE IDPRODUCTO = :1", (idproducto,))
-        conn.commit()
+        idproducto = request.form.get('idproducto', type=int)
 
-        cursor.close()
-        conn.close()
+        eliminar_productos([idproducto])
         return redirect(url_for('admin'))
-    except oracledb.Error as e:
+    except ErrorBD as e:
         print("Error Oracle en delete:", e)
         return f"Error al eliminar: {e}"
     except Exception as e:
@@ -480,14 +1736,15 @@ def update():
         cursor.execute("""
             UPDATE PRODUCTO
             SET NOMBRE = :1, DESCRIPCION = :2
-            WHERE IDPRODUCTO = :3
+            WHERE IDPRODUCTO = :3 AND FECHAELIMINACION IS NULL
         """, (nombre, desc, idproducto))
         conn.commit()
+        notificar_cambio_catalogo(idproducto)
 
         cursor.close()
         conn.close()
         return redirect(url_for('admin'))
-    except oracledb.Error as e:
+    except ErrorBD as e:
         print("Error Oracle en update:", e)
         return f"Error al actualizar: {e}"
     except Exception as e:
@@ -536,7 +1793,7 @@ def login():
             else:
                 return render_template('login.html', error="Usuario o contraseña incorrectos")
 
-        except oracledb.Error as e:
+        except ErrorBD as e:
             print("Error Oracle en login:", e)
             return render_template('login.html', error=f"Error al iniciar sesión: {e}")
         except Exception as e:
@@ -565,7 +1822,8 @@ def registrar_producto():
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        cursor.execute("""
+        # Con el id nuevo, la copia local y el índice del chatbot se ponen al día solo con esta fila
+        idproducto = backend_bd.insertar(cursor, """
             INSERT INTO PRODUCTO 
             (NOMBRE, DESCRIPCION, IDCATEGORIA, IDUNIDAD, CANTIDAD, ACTIVO, IDUSUARIOCREADOR)
             VALUES (:1, :2, :3, :4, :5, 1, :6)
@@ -576,9 +1834,10 @@ def registrar_producto():
             idunidad,
             cantidad,
             session['idusuario']
-        ))
+        ), "IDPRODUCTO")
 
         conn.commit()
+        notificar_cambio_catalogo(idproducto)
         cursor.close()
         conn.close()
 
@@ -611,10 +1870,11 @@ def actualizar_producto():
                 DESCRIPCION = :2,
                 CANTIDAD = :3,
                 IDUNIDAD = :4
-            WHERE IDPRODUCTO = :5
+            WHERE IDPRODUCTO = :5 AND FECHAELIMINACION IS NULL
         """, (nombre, descripcion, cantidad, idunidad, idproducto))
 
         conn.commit()
+        notificar_cambio_catalogo(idproducto)
         cursor.close()
         conn.close()
 
@@ -630,27 +1890,46 @@ def eliminar_producto():
     if 'idusuario' not in session:
         return redirect(url_for('login'))
 
-    idproducto = request.form.get('idproducto')
+    idproducto = request.form.get('idproducto', type=int)
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("DELETE FROM PRODUCTO WHERE IDPRODUCTO = :1", (idproducto,))
-        conn.commit()
-
-        cursor.close()
-        conn.close()
-
+        eliminar_productos([idproducto])
         return redirect(url_for('user'))
     except Exception as e:
         print("Error eliminando producto:", e)
         return f"Error al eliminar producto: {e}"
 
 
+# Eliminar varios productos seleccionados (JSON: {"ids": [1, 2, 3]})
+@app.route('/producto/eliminar_lote', methods=['POST'])
+def eliminar_productos_lote():
+    if 'idusuario' not in session:
+        return jsonify({"ok": False, "error": "No autorizado"}), 401
+
+    datos = request.get_json(silent=True) or {}
+    if not isinstance(datos, dict):
+        return jsonify({"ok": False, "error": 'Se espera un objeto JSON: {"ids": [...]}'}), 400
+    ids = datos.get("ids") or []
+    if not isinstance(ids, list) or not all(es_id(i) for i in ids):
+        return jsonify({"ok": False, "error": "ids debe ser una lista de números enteros"}), 400
+    ids = sorted(set(ids))
+    if not ids:
+        return jsonify({"ok": False, "error": "No se indicaron productos"}), 400
+    if len(ids) > MAX_ELIMINAR_LOTE:
+        return jsonify({"ok": False, "error": f"Máximo {MAX_ELIMINAR_LOTE} productos por petición"}), 400
+
+    try:
+        eliminados = eliminar_productos(ids)
+    except Exception as e:
+        print("Error eliminando productos en lote:", e)
+        return jsonify({"ok": False, "error": str(e)}), 500
+    return jsonify({"ok": True, "eliminados": eliminados})
+
+
 # Registrar envío de producto por correo (desde tarjeta del dashboard)
 
 @app.route('/producto/enviar_correo', methods=['POST'])
+@limitar_tasa("enviar_producto_correo")
 def enviar_producto_correo():
     if 'idusuario' not in session:
         return redirect(url_for('login'))
@@ -660,21 +1939,22 @@ def enviar_producto_correo():
     mensaje_extra = request.form.get('mensaje_extra', '').strip()
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Obtenemos datos del producto (incluyendo cantidad y unidad)
-        cursor.execute("""
-            SELECT P.NOMBRE, P.DESCRIPCION, P.CANTIDAD, U.NOMBRE, U.SIMBOLO
-            FROM PRODUCTO P
-            JOIN UNIDADMEDIDA U ON P.IDUNIDAD = U.IDUNIDAD
-            WHERE P.IDPRODUCTO = :1
-        """, (idproducto,))
-        row = cursor.fetchone()
+        with en_compartimento("bd"):
+            conn = get_db_connection()
+            cursor = conn.cursor()
 
-        if not row:
+            # Obtenemos datos del producto (incluyendo cantidad y unidad)
+            cursor.execute("""
+                SELECT P.NOMBRE, P.DESCRIPCION, P.CANTIDAD, U.NOMBRE, U.SIMBOLO
+                FROM PRODUCTO P
+                JOIN UNIDADMEDIDA U ON P.IDUNIDAD = U.IDUNIDAD
+                WHERE P.IDPRODUCTO = :1 AND P.FECHAELIMINACION IS NULL
+            """, (idproducto,))
+            row = cursor.fetchone()
             cursor.close()
             conn.close()
+
+        if not row:
             return "Producto no encontrado"
 
         nombre_prod, desc_prod, cant_prod, nombre_uni, simb_uni = row
@@ -758,34 +2038,58 @@ Cantidad disponible: {cant_prod} {simb_uni}
 """
 
         # 1️⃣ Enviar correo (texto + HTML)
-        enviar_correo_gmail(email_destino, asunto, cuerpo_texto, cuerpo_html)
-
-        # 2️⃣ Registrar envío en BD SOLO si el destinatario existe como usuario
-        cursor.execute("""
-            SELECT IDUSUARIO FROM USUARIO WHERE EMAIL = :1
-        """, (email_destino,))
-        dest_row = cursor.fetchone()
-
-        if dest_row:
-            idusuario_destino = dest_row[0]
-            cursor.execute("""
-                INSERT INTO ENVIOCORREO (IDUSUARIODESTINO, ASUNTO, CUERPO, FECHAENVIO, ENVIADO)
-                VALUES (:1, :2, :3, SYSTIMESTAMP, 1)
-            """, (idusuario_destino, asunto, cuerpo_texto))
-            conn.commit()
-
-        cursor.close()
-        conn.close()
+        # 2️⃣ Registrar envío (o el fallo) en BD SOLO si el destinatario existe como usuario
+        try:
+            with en_compartimento("smtp"):
+                enviar_correo_gmail(email_destino, asunto, cuerpo_texto, cuerpo_html)
+        except CompartimentoLleno:
+            raise
+        except Exception:
+            registrar_envio(email_destino, asunto, cuerpo_texto, enviado=False, solo_usuarios=True)
+            raise
+        registrar_envio(email_destino, asunto, cuerpo_texto, enviado=True, solo_usuarios=True)
 
         return redirect(url_for('user'))
 
+    except CompartimentoLleno:
+        raise
     except Exception as e:
         print("Error enviando producto por correo:", e)
         return f"Error al enviar producto por correo: {e}"
 
 
+def registrar_envio(email_destino, asunto, cuerpo, enviado, solo_usuarios=False):
+    """
+    Anota un envío en ENVIOCORREO, enviado o fallido (ENVIADO = 1 / 0). Con solo_usuarios
+    se anota solo si el destinatario es un usuario. Devuelve False si no se pudo guardar.
+    """
+    try:
+        with en_compartimento("bd"):
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT IDUSUARIO FROM USUARIO WHERE EMAIL = :1
+            """, (email_destino,))
+            row = cursor.fetchone()
+            idusuario_destino = row[0] if row else None
+
+            if idusuario_destino is not None or not solo_usuarios:
+                cursor.execute("""
+                    INSERT INTO ENVIOCORREO (IDUSUARIODESTINO, EMAILDESTINO, ASUNTO, CUERPO, FECHAENVIO, ENVIADO)
+                    VALUES (:1, :2, :3, :4, SYSTIMESTAMP, :5)
+                """, (idusuario_destino, email_destino, asunto, cuerpo, 1 if enviado else 0))
+                conn.commit()
+            cursor.close()
+            conn.close()
+        return True
+    except Exception as e:
+        print("Error registrando envío de correo:", e)
+        return False
+
+
 # Página general para enviar correos manuales
 @app.route('/correo', methods=['GET', 'POST'])
+@limitar_tasa("correo_index", metodos=("POST",))
 def correo_index():
     if 'idusuario' not in session:
         return redirect(url_for('login'))
@@ -803,34 +2107,297 @@ def correo_index():
         else:
             try:
                 # 1) Enviar correo
-                enviar_correo_gmail(email_destino, asunto, cuerpo, None)
+                with en_compartimento("smtp"):
+                    enviar_correo_gmail(email_destino, asunto, cuerpo, None)
+            except CompartimentoLleno:
+                raise
+            except Exception as e:
+                print("Error enviando correo:", e)
+                error = f"Ocurrió un error al enviar el correo: {e}"
+                # El intento fallido también queda en el historial (ENVIADO = 0)
+                registrar_envio(email_destino, asunto, cuerpo, enviado=False)
+            else:
+                # 2) Registrar envío en la tabla
+                if registrar_envio(email_destino, asunto, cuerpo, enviado=True):
+                    mensaje = "Correo enviado y registrado correctamente ✅"
+                else:
+                    mensaje = "Correo enviado, pero no se pudo registrar en el historial."
 
+    return render_template('correo_index.html', mensaje=mensaje, error=error)
 
-                # 2) Registrar envío en la tabla
-                conn = get_db_connection()
-                cursor = conn.cursor()
 
-                cursor.execute("""
-                    SELECT IDUSUARIO FROM USUARIO WHERE EMAIL = :1
-                """, (email_destino,))
-                row = cursor.fetchone()
-                idusuario_destino = row[0] if row else None
+# --- Historial de correos enviados ---
+# Paginación por llave (FECHAENVIO, IDENVIO): cada página pide "lo anterior a la
+# última fila vista", así el costo no crece con el número de página.
+def _cursor_historial(fila):
+    return f"{fila['fecha']}|{fila['id']}"
 
-                cursor.execute("""
-                    INSERT INTO ENVIOCORREO (IDUSUARIODESTINO, ASUNTO, CUERPO, FECHAENVIO, ENVIADO)
-                    VALUES (:1, :2, :3, SYSTIMESTAMP, 1)
-                """, (idusuario_destino, asunto, cuerpo))
 
-                conn.commit()
-                cursor.close()
-                conn.close()
+class CursorInvalido(ValueError):
+    pass
 
-                mensaje = "Correo enviado y registrado correctamente ✅"
-            except Exception as e:
-                print("Error enviando correo:", e)
-                error = f"Ocurrió un error al enviar el correo: {e}"
 
-    return render_template('correo_index.html', mensaje=mensaje, error=error)
+def leer_cursor_historial(antes):
+    """Parte el cursor "fecha|idenvio"; CursorInvalido si viene manipulado o truncado."""
+    fecha_txt, _, id_txt = antes.partition("|")
+    try:
+        return datetime.fromisoformat(fecha_txt), int(id_txt)
+    except ValueError:
+        raise CursorInvalido("Cursor 'antes' inválido") from None
+
+
+def buscar_historial_correos(limite=20, antes=None, destino=None, asunto=None, enviado=None):
+    """Devuelve (filas, cursor_siguiente). `antes` es el cursor devuelto por la página previa."""
+    condiciones = []
+    params = {}
+    if antes:
+        params["fecha"], params["idenvio"] = leer_cursor_historial(antes)
+        condiciones.append("(E.FECHAENVIO < :fecha OR (E.FECHAENVIO = :fecha AND E.IDENVIO < :idenvio))")
+    if destino:
+        condiciones.append("E.EMAILDESTINO = :destino")
+        params["destino"] = destino.strip()
+    if asunto:
+        condiciones.append("UPPER(E.ASUNTO) LIKE :asunto")
+        params["asunto"] = f"%{asunto.strip().upper()}%"
+    if enviado is not None:
+        condiciones.append("E.ENVIADO = :enviado")
+        params["enviado"] = 1 if enviado else 0
+
+    sql = """
+        SELECT E.IDENVIO, E.FECHAENVIO, E.EMAILDESTINO, E.ASUNTO, E.ENVIADO
+        FROM ENVIOCORREO E
+    """
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    sql += f" ORDER BY E.FECHAENVIO DESC, E.IDENVIO DESC FETCH FIRST {int(limite)} ROWS ONLY"
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    if antes:
+        # Sin esto el datetime se enviaría como DATE y se perderían las fracciones de segundo
+        cursor.setinputsizes(fecha=backend_bd.TIMESTAMP)
+    cursor.execute(sql, params)
+    filas = [{
+        "id": row[0],
+        "fecha": row[1].isoformat() if row[1] else None,
+        "destino": row[2],
+        "asunto": row[3],
+        "enviado": row[4] == 1,
+    } for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+
+    siguiente = _cursor_historial(filas[-1]) if len(filas) == limite else None
+    return filas, siguiente
+
+
+def _filtros_historial():
+    enviado = request.args.get('enviado')
+    return {
+        "limite": min(max(request.args.get('limite', 20, type=int), 1), 100),
+        "antes": request.args.get('antes') or None,
+        "destino": request.args.get('destino') or None,
+        "asunto": request.args.get('asunto') or None,
+        "enviado": None if enviado in (None, "") else enviado == "1",
+    }
+
+
+@app.route('/correo/historial', methods=['GET'])
+def correo_historial():
+    # Lista destinatarios y asuntos de todos: solo administradores
+    if 'idusuario' not in session or session.get('categoria') != 'admin':
+        return redirect(url_for('login'))
+
+    filtros = _filtros_historial()
+    error = None
+    estado = 200
+    try:
+        envios, siguiente = buscar_historial_correos(**filtros)
+    except CursorInvalido as e:
+        envios, siguiente = [], None
+        error = str(e)
+        estado = 400
+    except Exception as e:
+        print("Error leyendo historial de correos:", e)
+        envios, siguiente = [], None
+        error = f"No se pudo cargar el historial: {e}"
+
+    return render_template(
+        'correo_historial.html',
+        envios=envios,
+        siguiente=siguiente,
+        filtros=request.args,
+        error=error
+    ), estado
+
+
+@app.route('/correo/historial.json', methods=['GET'])
+def correo_historial_json():
+    if 'idusuario' not in session:
+        return jsonify({"ok": False, "error": "No autorizado"}), 401
+    if session.get('categoria') != 'admin':
+        return jsonify({"ok": False, "error": "Solo administradores"}), 403
+
+    try:
+        envios, siguiente = buscar_historial_correos(**_filtros_historial())
+    except CursorInvalido as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    except Exception as e:
+        print("Error leyendo historial de correos:", e)
+        return jsonify({"ok": False, "error": str(e)}), 500
+    return jsonify({"ok": True, "envios": envios, "siguiente": siguiente})
+
+
+# --- Retención: mover correos viejos a ENVIOCORREO_HIST por lotes ---
+def archivar_correos(dias=None, lote=None):
+    """
+    Mueve a ENVIOCORREO_HIST los envíos con más de `dias` días, de a `lote` filas
+    y con commit por lote para no retener bloqueos largos. Devuelve cuántas movió.
+    """
+    dias = CORREO_RETENCION_DIAS if dias is None else dias
+    lote = min(CORREO_ARCHIVO_LOTE if lote is None else lote, 1000)
+    corte = datetime.now() - timedelta(days=dias)
+    movidas = 0
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        while True:
+            cursor.execute(f"""
+                SELECT IDENVIO FROM ENVIOCORREO
+                WHERE FECHAENVIO < :1
+                ORDER BY FECHAENVIO
+                FETCH FIRST {int(lote)} ROWS ONLY
+            """, (corte,))
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                break
+
+            marcas = ", ".join(f":{n + 1}" for n in range(len(ids)))
+            cursor.execute(f"""
+                INSERT INTO ENVIOCORREO_HIST
+                    (IDENVIO, IDUSUARIODESTINO, EMAILDESTINO, ASUNTO, CUERPO, FECHAENVIO, ENVIADO)
+                SELECT IDENVIO, IDUSUARIODESTINO, EMAILDESTINO, ASUNTO, CUERPO, FECHAENVIO, ENVIADO
+                FROM ENVIOCORREO
+                WHERE IDENVIO IN ({marcas})
+            """, ids)
+            cursor.execute(f"DELETE FROM ENVIOCORREO WHERE IDENVIO IN ({marcas})", ids)
+            conn.commit()
+            movidas += len(ids)
+
+            if len(ids) < lote:
+                break
+            time.sleep(0.1)  # deja respirar a las escrituras normales entre lotes
+    finally:
+        cursor.close()
+        conn.close()
+    return movidas
+
+
+def _bucle_archivo_correos():
+    while True:
+        time.sleep(CORREO_ARCHIVO_INTERVALO)
+        try:
+            movidas = archivar_correos()
+            if movidas:
+                print(f"Retención de correos: {movidas} filas movidas a ENVIOCORREO_HIST")
+        except Exception as e:
+            print("Error en la retención de correos:", e)
+
+
+@app.cli.command("migrar")
+def migrar_cli():
+    """Aplica en la BD configurada las migraciones pendientes de la carpeta migraciones/."""
+    conn = get_db_connection()
+    try:
+        hechas = aplicar_migraciones(conn, DB_BACKEND)
+    finally:
+        conn.close()
+    for version, nombre in hechas:
+        print(f"✅ {version:03d} {nombre}")
+    if not hechas:
+        print("El esquema ya estaba al día.")
+
+
+# --- Datos de prueba para la BD local ---
+# (nombre de producto, categoría)
+NOMBRES_SEMILLA = [("Queso", "Quesos"), ("Yogur", "Yogures"), ("Leche", "Leches"), ("Mantequilla", "Mantequillas"),
+                   ("Kumis", "Bebidas fermentadas"), ("Helado", "Helados"), ("Crema", "Cremas"),
+                   ("Arequipe", "Dulces"), ("Cuajada", "Quesos frescos"), ("Suero", "Sueros")]
+ADJETIVOS_SEMILLA = ["fresco", "maduro", "descremado", "entero", "griego", "natural", "light", "campesino", "deslactosado", "artesanal"]
+
+
+@app.cli.command("sembrar")
+@click.option("--productos", default=100000, show_default=True, help="Cantidad de productos a crear")
+@click.option("--lote", default=10000, show_default=True, help="Filas por executemany")
+def sembrar_cli(productos, lote):
+    """Llena la BD local (DB_BACKEND=sqlite) con categorías, unidades y productos de prueba."""
+    if DB_BACKEND != "sqlite":
+        print("❌ sembrar solo está permitido con DB_BACKEND=sqlite")
+        raise SystemExit(1)
+
+    rnd = random.Random(42)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT COUNT(*) FROM USUARIO")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("""
+            INSERT INTO USUARIO (NOMBRE, EMAIL, PASSWORDHASH, FECHAREGISTRO, ACTIVO)
+            VALUES (:1, :2, :3, SYSTIMESTAMP, 1)
+        """, ("Demo", "demo@lacteos.local", generate_password_hash("demo")))
+        cursor.executemany("INSERT INTO CATEGORIAPRODUCTO (NOMBRE) VALUES (:1)",
+                           sorted({(categoria,) for _, categoria in NOMBRES_SEMILLA}))
+        cursor.executemany("INSERT INTO UNIDADMEDIDA (NOMBRE, SIMBOLO) VALUES (:1, :2)",
+                           [("Kilogramo", "kg"), ("Gramo", "g"), ("Litro", "L"), ("Mililitro", "ml"), ("Unidad", "und")])
+        conn.commit()
+
+    cursor.execute("SELECT MIN(IDUSUARIO) FROM USUARIO")
+    idusuario = cursor.fetchone()[0]
+    cursor.execute("SELECT NOMBRE, IDCATEGORIA FROM CATEGORIAPRODUCTO")
+    categorias = dict(cursor.fetchall())
+    cursor.execute("SELECT IDUNIDAD FROM UNIDADMEDIDA")
+    unidades = [row[0] for row in cursor.fetchall()]
+
+    creados = 0
+    while creados < productos:
+        filas = []
+        for n in range(creados, min(creados + lote, productos)):
+            base, categoria = rnd.choice(NOMBRES_SEMILLA)
+            nombre = f"{base} {rnd.choice(ADJETIVOS_SEMILLA)} {n}"
+            filas.append((
+                nombre, f"Producto de prueba {n}", categorias[categoria], rnd.choice(unidades),
+                rnd.randint(0, 500), 1 if rnd.random() < 0.9 else 0, idusuario
+            ))
+        cursor.executemany("""
+            INSERT INTO PRODUCTO
+            (NOMBRE, DESCRIPCION, IDCATEGORIA, IDUNIDAD, CANTIDAD, ACTIVO, IDUSUARIOCREADOR)
+            VALUES (:1, :2, :3, :4, :5, :6, :7)
+        """, filas)
+        conn.commit()
+        creados += len(filas)
+        print(f"  {creados}/{productos} productos")
+
+    cursor.close()
+    conn.close()
+    # Este es otro proceso: un servidor ya levantado lo ve cuando caducan sus ETag
+    # (ETAG_VIGENCIA), con la copia completa periódica y con la recarga del índice
+    print(f"✅ BD local sembrada ({DB_SQLITE_RUTA}); usuario demo@lacteos.local / demo")
+
+
+@app.cli.command("archivar-correos")
+def archivar_correos_cli():
+    """Mueve a ENVIOCORREO_HIST los correos más viejos que CORREO_RETENCION_DIAS."""
+    movidas = archivar_correos()
+    print(f"✅ {movidas} correos archivados")
+
+
+@app.cli.command("purgar-productos")
+@click.option("--dias", type=int, default=None, help="Antigüedad mínima del borrado lógico (por defecto PRODUCTO_PURGA_DIAS).")
+def purgar_productos_cli(dias):
+    """Borra definitivamente los productos eliminados hace más de PRODUCTO_PURGA_DIAS días."""
+    borradas = purgar_productos(dias)
+    print(f"✅ {borradas} productos purgados")
 
 
 @app.route('/logout')
@@ -0,0 +1,232 @@
+import heapq
+import re
+import threading
+import unicodedata
+
+# --- Motor de intenciones del chatbot ---
+# Convierte una pregunta libre ("¿cuánto queso fresco hay?", "productos inactivos de yogur")
+# en filtros y la contesta desde un índice en memoria de los productos, sin ir a la BD.
+
+PALABRAS_VACIAS = {
+    "a", "al", "de", "del", "el", "la", "las", "los", "lo", "un", "una", "unos", "unas",
+    "y", "o", "en", "con", "sin", "por", "para", "que", "cual", "cuales", "me", "mi",
+    "muestrame", "mostrar", "muestra", "ver", "dame", "quiero", "hay", "tenemos", "tengo",
+    "queda", "quedan", "producto", "productos", "lista", "listar", "todos", "todas",
+    "cuanto", "cuanta", "cuantos", "cuantas", "cantidad", "stock", "existencia", "existencias",
+    "es", "son", "esta", "estan", "categoria", "categorias", "tipo", "unidad", "unidades",
+}
+PALABRAS_CANTIDAD = {"cuanto", "cuanta", "cuantos", "cuantas", "cantidad", "stock", "existencia", "existencias", "queda", "quedan"}
+PALABRAS_INACTIVO = {"inactivo", "inactivos", "inactiva", "inactivas", "desactivado", "desactivados", "desactivada", "desactivadas"}
+PALABRAS_ACTIVO = {"activo", "activos", "activa", "activas", "disponible", "disponibles"}
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes: 'Cuánto' -> 'cuanto'."""
+    texto = unicodedata.normalize("NFKD", texto or "").lower()
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def raiz(palabra):
+    """Singular aproximado para que 'quesos' y 'queso' coincidan."""
+    if len(palabra) > 4 and palabra.endswith("es") and palabra[-3] in "lrndzj":
+        return palabra[:-2]
+    if len(palabra) > 3 and palabra.endswith("s"):
+        return palabra[:-1]
+    return palabra
+
+
+def tokens(texto):
+    return re.findall(r"[a-z0-9]+", normalizar(texto))
+
+
+def interpretar(texto, categorias, unidades):
+    """
+    Devuelve los filtros de la pregunta:
+      {"intencion": "cantidad"|"listar", "activo": True|False|None,
+       "idcategoria": id|None, "idunidad": id|None, "palabras": [raíces a buscar]}
+    `categorias` es [(id, nombre)] y `unidades` es [(id, nombre, simbolo)].
+    La categoría mencionada no filtra: sus palabras siguen en "palabras" (el nombre del
+    producto también puede tenerlas, "queso fresco" en la categoría "Quesos") y
+    solo suma puntos en IndiceProductos.buscar.
+    """
+    palabras = tokens(texto)
+    normal = " ".join(palabras)
+    filtros = {"intencion": "listar", "activo": None, "idcategoria": None, "idunidad": None, "palabras": []}
+
+    if PALABRAS_CANTIDAD & set(palabras):
+        filtros["intencion"] = "cantidad"
+
+    if re.search(r"\bno (esta|estan )?activ", normal) or PALABRAS_INACTIVO & set(palabras):
+        filtros["activo"] = False
+    elif PALABRAS_ACTIVO & set(palabras):
+        filtros["activo"] = True
+
+    # Categoría: la de nombre más largo que aparezca completa en la pregunta
+    raices = [raiz(p) for p in palabras]
+    usadas = set()
+    for idcategoria, nombre in sorted(categorias, key=lambda c: -len(c[1] or "")):
+        nombre_raices = [raiz(p) for p in tokens(nombre)]
+        if nombre_raices and _contiene(raices, nombre_raices):
+            filtros["idcategoria"] = idcategoria
+            break
+
+    for idunidad, nombre, simbolo in unidades:
+        candidatos = {raiz(p) for p in tokens(nombre)} | {normalizar(simbolo or "")}
+        if candidatos & set(raices) - {""}:
+            filtros["idunidad"] = idunidad
+            usadas |= candidatos
+            break
+
+    filtros["palabras"] = [
+        r for p, r in zip(palabras, raices)
+        if p not in PALABRAS_VACIAS and p not in PALABRAS_ACTIVO and p not in PALABRAS_INACTIVO
+        and p != "no" and r not in usadas
+    ]
+    return filtros
+
+
+def _contiene(lista, sub):
+    n = len(sub)
+    return any(lista[i:i + n] == sub for i in range(len(lista) - n + 1))
+
+
+class IndiceProductos:
+    """
+    Índice invertido de productos en memoria. Cada fila es
+    (id, nombre, descripcion, cantidad, activo, idcategoria, categoria, idunidad, simbolo).
+    Se indexan las raíces del nombre, la descripción y el nombre de la categoría.
+    """
+
+    def __init__(self):
+        self.productos = {}
+        self.por_nombre = {}
+        self.por_descripcion = {}
+        self.por_categoria = {}
+        self.categorias = []
+        self.unidades = []
+        self.cargado = False
+        self._pendientes = set()
+        self._completo_pendiente = True
+        self._cambios_durante_carga = None
+        self._lock = threading.RLock()
+
+    # --- Carga ---
+    def iniciar_carga(self):
+        """Llamar antes de leer las filas de una recarga completa (ver cargar)."""
+        with self._lock:
+            self._cambios_durante_carga = set()
+            self._completo_pendiente = False
+
+    def cargar(self, filas, categorias, unidades):
+        """
+        Arma un índice nuevo aparte y lo cambia por el actual de una vez. Los productos
+        marcados desde iniciar_carga() pueden venir viejos en `filas`: quedan pendientes.
+        """
+        indices = ({}, {}, {})
+        productos = {}
+        for fila in filas:
+            productos[fila[0]] = fila
+            self._indexar(fila, *indices)
+        with self._lock:
+            self.productos = productos
+            self.por_nombre, self.por_descripcion, self.por_categoria = indices
+            self.categorias = list(categorias)
+            self.unidades = list(unidades)
+            self.cargado = True
+            if self._cambios_durante_carga:
+                self._pendientes |= self._cambios_durante_carga
+            self._cambios_durante_carga = None
+
+    def actualizar(self, filas, ids):
+        """Reemplaza los productos `ids` por `filas` (los que no vengan se consideran borrados)."""
+        nuevas = {fila[0]: fila for fila in filas}
+        with self._lock:
+            for idproducto in ids:
+                vieja = self.productos.pop(idproducto, None)
+                if vieja:
+                    self._desindexar(vieja)
+                fila = nuevas.get(idproducto)
+                if fila:
+                    self.productos[idproducto] = fila
+                    self._indexar(fila, self.por_nombre, self.por_descripcion, self.por_categoria)
+
+    @staticmethod
+    def _indexar(fila, por_nombre, por_descripcion, por_categoria):
+        for campo, indice in ((1, por_nombre), (2, por_descripcion), (6, por_categoria)):
+            for r in {raiz(p) for p in tokens(fila[campo])}:
+                indice.setdefault(r, set()).add(fila[0])
+
+    def _desindexar(self, fila):
+        for campo, indice in ((1, self.por_nombre), (2, self.por_descripcion), (6, self.por_categoria)):
+            for r in {raiz(p) for p in tokens(fila[campo])}:
+                indice.get(r, set()).discard(fila[0])
+
+    # --- Cambios pendientes ---
+    def marcar_cambio(self, idproducto=None):
+        with self._lock:
+            if idproducto is None:
+                self._completo_pendiente = True
+            else:
+                self._pendientes.add(int(idproducto))
+                if self._cambios_durante_carga is not None:
+                    self._cambios_durante_carga.add(int(idproducto))
+
+    def tomar_pendientes(self):
+        """Devuelve (completo, ids) y los limpia; si la recarga falla hay que devolverlos con marcar_cambio."""
+        with self._lock:
+            completo = self._completo_pendiente
+            ids = sorted(self._pendientes)
+            self._pendientes.clear()
+            self._completo_pendiente = False
+            return completo, ids
+
+    # --- Búsqueda ---
+    def buscar(self, filtros, limite=20):
+        """
+        Devuelve (productos ordenados por relevancia y nombre, total encontrado).
+        Cada palabra suma 2 si está en el nombre, 1 en la descripción y 1 en la categoría.
+        Manda la cantidad de palabras cubiertas: si algún producto las tiene todas, solo
+        cuentan esos (Y); si no, los que cubren más (para no quedar en blanco). Entre
+        ellos van primero los que las tienen en el nombre y luego por puntaje.
+        """
+        with self._lock:
+            palabras = list(dict.fromkeys(filtros["palabras"]))
+            if palabras:
+                puntaje, cubiertas, en_nombre = {}, {}, {}
+                for p in palabras:
+                    for indice, puntos in ((self.por_nombre, 2), (self.por_descripcion, 1), (self.por_categoria, 1)):
+                        for idproducto in indice.get(p, ()):
+                            puntaje[idproducto] = puntaje.get(idproducto, 0) + puntos
+                            cubiertas.setdefault(idproducto, set()).add(p)
+                    for idproducto in self.por_nombre.get(p, ()):
+                        en_nombre[idproducto] = en_nombre.get(idproducto, 0) + 1
+                candidatos = [
+                    (self.productos[i], len(cubiertas[i]), en_nombre.get(i, 0), s) for i, s in puntaje.items()
+                ]
+            else:
+                candidatos = [(fila, 0, 0, 0) for fila in self.productos.values()]
+
+        resultado = []
+        for fila, cubiertas, en_nombre, puntos in candidatos:
+            if filtros["activo"] is not None and bool(fila[4] == 1) != filtros["activo"]:
+                continue
+            if filtros["idunidad"] is not None and fila[7] != filtros["idunidad"]:
+                continue
+            if filtros["idcategoria"] is not None and fila[5] == filtros["idcategoria"]:
+                puntos += 1
+            resultado.append((fila, cubiertas, en_nombre, puntos))
+
+        if resultado:
+            maximo = max(r[1] for r in resultado)
+            resultado = [r for r in resultado if r[1] == maximo]
+        mejores = heapq.nsmallest(limite, resultado, key=lambda r: (-r[2], -r[3], normalizar(r[0][1])))
+        return [r[0] for r in mejores], len(resultado)
+
+    def resumen(self):
+        with self._lock:
+            return {
+                "cargado": self.cargado,
+                "productos": len(self.productos),
+                "pendientes": len(self._pendientes),
+                "completo_pendiente": self._completo_pendiente,
+            }
@@ -0,0 +1,305 @@
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+
+# --- Backends de base de datos ---
+# app.py escribe SQL de Oracle con binds posicionales (:1, :2) o con nombre (:fecha)
+# y solo usa conectar() / cursor() / commit() / close(). Cada backend entrega
+# conexiones con esa misma interfaz:
+#   - BackendOracle: pool de oracledb contra Oracle Cloud (producción)
+#   - BackendSQLite: archivo local, traduce el SQL al vuelo (desarrollo y benchmarks)
+# es_caida(error) dice si un error significa que la BD no responde (para el cortacircuitos).
+
+
+class CursorVigilado:
+    """Cursor que avisa a `vigia(error)` tras cada llamada a la BD (error=None si salió bien)."""
+
+    def __init__(self, cursor, vigia):
+        self._cursor = cursor
+        self._vigia = vigia
+
+    @property
+    def arraysize(self):
+        return self._cursor.arraysize
+
+    @arraysize.setter
+    def arraysize(self, valor):
+        self._cursor.arraysize = valor
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+    def _llamar(self, funcion, *args):
+        try:
+            resultado = funcion(*args)
+        except Exception as e:
+            self._vigia(e)
+            raise
+        self._vigia(None)
+        return resultado
+
+    def execute(self, *args):
+        return self._llamar(self._cursor.execute, *args)
+
+    def executemany(self, *args):
+        return self._llamar(self._cursor.executemany, *args)
+
+    def fetchone(self):
+        return self._llamar(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._llamar(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._llamar(self._cursor.fetchall)
+
+
+class ConexionVigilada:
+    """Conexión cuyos cursores y commit() avisan a `vigia`; lo demás pasa directo."""
+
+    def __init__(self, conn, vigia):
+        self._conn = conn
+        self._vigia = vigia
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+    def __setattr__(self, nombre, valor):
+        if nombre.startswith("_"):
+            object.__setattr__(self, nombre, valor)
+        else:
+            setattr(self._conn, nombre, valor)
+
+    def cursor(self):
+        return CursorVigilado(self._conn.cursor(), self._vigia)
+
+    def commit(self):
+        try:
+            self._conn.commit()
+        except Exception as e:
+            self._vigia(e)
+            raise
+        self._vigia(None)
+
+
+class BackendOracle:
+    nombre = "oracle"
+    # Red caída, sesión cortada, call_timeout vencido o sin listener. DPY-4005 (esperar
+    # una conexión libre del pool) no está: es saturación local, no una BD caída.
+    CODIGOS_CAIDA = ("DPY-4011", "DPY-4024", "DPI-1067", "DPI-1080", "DPY-6000", "DPY-6005",
+                     "ORA-03113", "ORA-03114", "ORA-03135", "ORA-12170", "ORA-12514", "ORA-12541")
+
+    def __init__(self, user, password, dsn, wallet_dir, wallet_password,
+                 minimo, maximo, connect_timeout, wait_timeout, call_timeout):
+        import oracledb
+        self._oracledb = oracledb
+        self.Error = oracledb.Error
+        self.IntegrityError = oracledb.IntegrityError
+        self.TIMESTAMP = oracledb.DB_TYPE_TIMESTAMP
+        self._parametros = dict(
+            user=user,
+            password=password,
+            dsn=dsn,
+            config_dir=wallet_dir,
+            wallet_location=wallet_dir,
+            wallet_password=wallet_password,
+            min=minimo,
+            max=maximo,
+            increment=1,
+            tcp_connect_timeout=connect_timeout,
+            getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+            wait_timeout=wait_timeout
+        )
+        self.call_timeout = call_timeout
+        self.pool = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Un único pool por proceso: conn.close() devuelve la conexión al pool en vez de cerrarla.
+        if self.pool is None:
+            with self._lock:
+                if self.pool is None:
+                    self.pool = self._oracledb.create_pool(**self._parametros)
+        return self.pool
+
+    def conectar(self):
+        conn = self._pool().acquire()
+        conn.call_timeout = self.call_timeout
+        return conn
+
+    def describir_error(self, error):
+        error_obj, = error.args
+        return f"Código {error_obj.code}, Mensaje: {error_obj.message}"
+
+    def es_caida(self, error):
+        texto = str(error)
+        return any(codigo in texto for codigo in self.CODIGOS_CAIDA)
+
+    def insertar(self, cursor, sql, params, columna_id):
+        """INSERT con binds posicionales; devuelve el id generado (RETURNING ... INTO)."""
+        params = list(params)
+        id_var = cursor.var(self._oracledb.DB_TYPE_NUMBER)
+        cursor.execute(f"{sql} RETURNING {columna_id} INTO :{len(params) + 1}", params + [id_var])
+        return int(id_var.getvalue()[0])
+
+    def saturado(self):
+        return self.pool is not None and self.pool.busy >= self.pool.max
+
+    def explicar(self, sql, params=None):
+        """
+        Plan de ejecución con EXPLAIN PLAN + DBMS_XPLAN, en una conexión propia del pool
+        (PLAN_TABLE se escribe y se limpia sin tocar la transacción de nadie). Los binds
+        se pasan igual que en la sentencia original: el driver exige un valor por cada uno.
+        """
+        ident = f"perfil{threading.get_ident() % 100000}{int(time.time() * 1000) % 100000}"
+        conn = self.conectar()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"EXPLAIN PLAN SET STATEMENT_ID = '{ident}' FOR {sql}",
+                           params if params is not None else [])
+            cursor.execute("SELECT PLAN_TABLE_OUTPUT FROM TABLE(DBMS_XPLAN.DISPLAY(NULL, :1, 'TYPICAL'))", [ident])
+            plan = [row[0] for row in cursor.fetchall()]
+            cursor.execute("DELETE FROM PLAN_TABLE WHERE STATEMENT_ID = :1", [ident])
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+        return plan
+
+    def estado(self):
+        if self.pool is None:
+            return {"backend": self.nombre, "creado": False}
+        return {
+            "backend": self.nombre,
+            "creado": True,
+            "abiertas": self.pool.opened,
+            "ocupadas": self.pool.busy,
+            "maximo": self.pool.max,
+            "saturacion": round(self.pool.busy / self.pool.max, 2) if self.pool.max else None,
+        }
+
+
+# --- SQLite ---
+# TIMESTAMP se guarda como texto ISO ('YYYY-MM-DD HH:MM:SS[.ffffff]') y vuelve como datetime
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_converter("TIMESTAMP", lambda b: datetime.fromisoformat(b.decode()))
+
+
+@lru_cache(maxsize=512)
+def traducir_sql(sql):
+    """SQL de Oracle (como lo escribe app.py) -> SQLite."""
+    sql = re.sub(r":(\d+)\b", r"?\1", sql)
+    sql = re.sub(r"\bSYSTIMESTAMP\b", "datetime('now', 'localtime')", sql)
+    sql = re.sub(r"\s+FROM\s+DUAL\b", "", sql, flags=re.I)
+    sql = re.sub(r"FETCH\s+FIRST\s+(\d+)\s+ROWS\s+ONLY", r"LIMIT \1", sql, flags=re.I)
+    return sql
+
+
+class CursorSQLite:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.arraysize = 100
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(traducir_sql(sql), params)
+        return self
+
+    def executemany(self, sql, filas):
+        self._cursor.executemany(traducir_sql(sql), filas)
+
+    def setinputsizes(self, *args, **kwargs):
+        pass
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, n=None):
+        return self._cursor.fetchmany(n or self.arraysize)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+class ConexionSQLite:
+    """Envoltorio con la interfaz de una conexión de oracledb. close() la deja para reusar en el hilo."""
+    call_timeout = 0
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return CursorSQLite(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        # Igual que devolver una conexión al pool: lo no confirmado se descarta
+        self._conn.rollback()
+
+
+class BackendSQLite:
+    nombre = "sqlite"
+    Error = sqlite3.Error
+    IntegrityError = sqlite3.IntegrityError
+    TIMESTAMP = None
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+
+    def conectar(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, detect_types=sqlite3.PARSE_DECLTYPES,
+                                   timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return ConexionSQLite(conn)
+
+    def describir_error(self, error):
+        return str(error)
+
+    def insertar(self, cursor, sql, params, columna_id):
+        cursor.execute(sql, params)
+        return cursor.lastrowid
+
+    def es_caida(self, error):
+        # El archivo no se puede abrir o leer; "database is locked" es contención, no caída
+        texto = str(error)
+        return isinstance(error, sqlite3.OperationalError) and (
+            "unable to open" in texto or "disk I/O error" in texto
+        )
+
+    def saturado(self):
+        return False
+
+    def explicar(self, sql, params=None):
+        # Conexión aparte: se llama desde el hilo de planes del perfilador
+        conn = sqlite3.connect(self.ruta, timeout=5)
+        try:
+            filas = conn.execute("EXPLAIN QUERY PLAN " + traducir_sql(sql), params or ()).fetchall()
+        finally:
+            conn.close()
+        return [row[3] for row in filas]
+
+    def estado(self):
+        return {"backend": self.nombre, "ruta": self.ruta}
@@ -0,0 +1,246 @@
+import sqlite3
+import threading
+import time
+
+# --- Copia local (SQLite) del catálogo ---
+# Guarda PRODUCTO, CATEGORIAPRODUCTO y UNIDADMEDIDA en un archivo local. Se refresca
+# en segundo plano: cada pocos segundos solo los productos que la app marcó como
+# cambiados, y cada tanto una copia completa para recoger cambios hechos por fuera.
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS UNIDADMEDIDA (
+    IDUNIDAD INTEGER PRIMARY KEY,
+    NOMBRE TEXT,
+    SIMBOLO TEXT
+);
+CREATE TABLE IF NOT EXISTS CATEGORIAPRODUCTO (
+    IDCATEGORIA INTEGER PRIMARY KEY,
+    NOMBRE TEXT
+);
+CREATE TABLE IF NOT EXISTS PRODUCTO (
+    IDPRODUCTO INTEGER PRIMARY KEY,
+    NOMBRE TEXT,
+    DESCRIPCION TEXT,
+    ACTIVO INTEGER,
+    CANTIDAD NUMERIC,
+    IDUNIDAD INTEGER,
+    IDCATEGORIA INTEGER
+);
+CREATE INDEX IF NOT EXISTS IX_PRODUCTO_CATEGORIA_NOMBRE ON PRODUCTO (IDCATEGORIA, NOMBRE);
+CREATE INDEX IF NOT EXISTS IX_PRODUCTO_NOMBRE ON PRODUCTO (NOMBRE);
+"""
+
+SQL_PRODUCTOS_ORIGEN = """
+    SELECT IDPRODUCTO, NOMBRE, DESCRIPCION, ACTIVO, CANTIDAD, IDUNIDAD, IDCATEGORIA
+    FROM PRODUCTO
+    WHERE FECHAELIMINACION IS NULL
+"""
+
+# Tamaño de cada lote de IDs en el refresco incremental (límite de IN de Oracle: 1000)
+LOTE_IDS = 500
+
+
+class InstantaneaNoDisponible(RuntimeError):
+    """La copia local todavía no se ha llenado o no se puede leer."""
+
+
+class InstantaneaCatalogo:
+
+    def __init__(self, ruta, obtener_conexion):
+        self.ruta = ruta
+        self.obtener_conexion = obtener_conexion
+        self.lista = False
+        self.ultimo_refresco = None
+        self.ultimo_completo = None
+        self.ultimo_error = None
+        self._pendientes = set()
+        self._completo_pendiente = True
+        self._lock = threading.Lock()
+        self._refresco_lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._local = threading.local()
+        self._hilo = None
+
+        conn = self._conexion()
+        conn.executescript(ESQUEMA)
+        fila = conn.execute("SELECT COUNT(*) FROM CATEGORIAPRODUCTO").fetchone()
+        # Si el archivo ya tenía datos de una ejecución anterior, sirve desde el arranque
+        self.lista = fila[0] > 0
+
+    def _conexion(self):
+        # Una conexión por hilo; WAL deja leer mientras el hilo de refresco escribe
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- Marcado de cambios ---
+    def marcar_cambio(self, idproducto=None):
+        """Anota un producto cambiado (o None = no se sabe cuál: copia completa)."""
+        with self._lock:
+            if idproducto is None:
+                self._completo_pendiente = True
+            else:
+                self._pendientes.add(int(idproducto))
+        self._despertar.set()
+
+    def al_dia(self):
+        """True si no hay cambios conocidos sin copiar."""
+        with self._lock:
+            return self.lista and not self._pendientes and not self._completo_pendiente
+
+    # --- Refresco ---
+    def refrescar(self, completo=False):
+        with self._refresco_lock:
+            with self._lock:
+                completo = completo or self._completo_pendiente
+                pendientes = set() if completo else set(self._pendientes)
+                self._pendientes -= pendientes
+                if completo:
+                    self._pendientes.clear()
+                    self._completo_pendiente = False
+            try:
+                if completo:
+                    self._copiar_todo()
+                    self.ultimo_completo = time.time()
+                elif pendientes:
+                    self._copiar_productos(sorted(pendientes))
+            except Exception as e:
+                # Lo que no se pudo copiar queda pendiente para la próxima vuelta
+                with self._lock:
+                    if completo:
+                        self._completo_pendiente = True
+                    self._pendientes |= pendientes
+                self.ultimo_error = str(e)
+                raise
+            self.ultimo_refresco = time.time()
+            self.ultimo_error = None
+
+    def _copiar_todo(self):
+        origen = self.obtener_conexion()
+        try:
+            cursor = origen.cursor()
+            cursor.execute("SELECT IDUNIDAD, NOMBRE, SIMBOLO FROM UNIDADMEDIDA")
+            unidades = cursor.fetchall()
+            cursor.execute("SELECT IDCATEGORIA, NOMBRE FROM CATEGORIAPRODUCTO")
+            categorias = cursor.fetchall()
+            cursor.arraysize = 1000
+            cursor.execute(SQL_PRODUCTOS_ORIGEN)
+            productos = cursor.fetchall()
+            cursor.close()
+        finally:
+            origen.close()
+
+        conn = self._conexion()
+        with conn:
+            conn.execute("DELETE FROM UNIDADMEDIDA")
+            conn.executemany("INSERT INTO UNIDADMEDIDA VALUES (?, ?, ?)", unidades)
+            conn.execute("DELETE FROM CATEGORIAPRODUCTO")
+            conn.executemany("INSERT INTO CATEGORIAPRODUCTO VALUES (?, ?)", categorias)
+            conn.execute("DELETE FROM PRODUCTO")
+            conn.executemany("INSERT INTO PRODUCTO VALUES (?, ?, ?, ?, ?, ?, ?)", productos)
+        self.lista = True
+
+    def _copiar_productos(self, ids):
+        origen = self.obtener_conexion()
+        try:
+            cursor = origen.cursor()
+            filas = []
+            for i in range(0, len(ids), LOTE_IDS):
+                lote = ids[i:i + LOTE_IDS]
+                marcas = ", ".join(f":{n + 1}" for n in range(len(lote)))
+                cursor.execute(SQL_PRODUCTOS_ORIGEN + f" AND IDPRODUCTO IN ({marcas})", lote)
+                filas.extend(cursor.fetchall())
+            cursor.close()
+        finally:
+            origen.close()
+
+        encontrados = {fila[0] for fila in filas}
+        borrados = [(i,) for i in ids if i not in encontrados]
+        conn = self._conexion()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO PRODUCTO VALUES (?, ?, ?, ?, ?, ?, ?)", filas)
+            conn.executemany("DELETE FROM PRODUCTO WHERE IDPRODUCTO = ?", borrados)
+
+    def iniciar(self, intervalo, intervalo_completo):
+        """Arranca el hilo de refresco (una sola vez por proceso)."""
+        if self._hilo is not None:
+            return
+        self._hilo = threading.Thread(
+            target=self._bucle, args=(intervalo, intervalo_completo),
+            name="instantanea-catalogo", daemon=True
+        )
+        self._hilo.start()
+
+    def _bucle(self, intervalo, intervalo_completo):
+        while True:
+            completo = (self.ultimo_completo is None
+                        or time.time() - self.ultimo_completo >= intervalo_completo)
+            try:
+                self.refrescar(completo=completo)
+            except Exception as e:
+                print("Error refrescando copia local del catálogo:", e)
+            self._despertar.wait(intervalo)
+            self._despertar.clear()
+
+    # --- Lecturas (mismas columnas y orden que las consultas a Oracle) ---
+    def _leer(self, sql, params=()):
+        if not self.lista:
+            raise InstantaneaNoDisponible("La copia local del catálogo aún no está disponible")
+        try:
+            return self._conexion().execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            raise InstantaneaNoDisponible(str(e))
+
+    def productos_dashboard(self):
+        return self._leer("""
+            SELECT P.IDPRODUCTO, P.NOMBRE, P.DESCRIPCION, P.ACTIVO, P.CANTIDAD,
+                   U.NOMBRE, U.SIMBOLO, P.IDUNIDAD
+            FROM PRODUCTO P
+            JOIN UNIDADMEDIDA U ON P.IDUNIDAD = U.IDUNIDAD
+            ORDER BY P.IDPRODUCTO
+        """)
+
+    def categorias(self):
+        return self._leer("SELECT IDCATEGORIA, NOMBRE FROM CATEGORIAPRODUCTO ORDER BY NOMBRE")
+
+    def unidades(self):
+        return self._leer("SELECT IDUNIDAD, NOMBRE, SIMBOLO FROM UNIDADMEDIDA ORDER BY NOMBRE")
+
+    def productos_chat(self, tipo, filtro=None):
+        base_sql = """
+            SELECT P.IDPRODUCTO, P.NOMBRE, P.DESCRIPCION, P.CANTIDAD, U.SIMBOLO, C.NOMBRE
+            FROM PRODUCTO P
+            JOIN UNIDADMEDIDA U ON P.IDUNIDAD = U.IDUNIDAD
+            JOIN CATEGORIAPRODUCTO C ON P.IDCATEGORIA = C.IDCATEGORIA
+        """
+        if tipo == "activos":
+            return self._leer(base_sql + " WHERE P.ACTIVO = 1 ORDER BY P.NOMBRE")
+        elif tipo == "categoria" and filtro:
+            return self._leer(base_sql + " WHERE P.IDCATEGORIA = ? ORDER BY P.NOMBRE", (filtro,))
+        return self._leer(base_sql + " ORDER BY P.NOMBRE")
+
+    def productos_indice(self):
+        """Filas para el índice del chatbot (ver asistente.IndiceProductos)."""
+        return self._leer("""
+            SELECT P.IDPRODUCTO, P.NOMBRE, P.DESCRIPCION, P.CANTIDAD, P.ACTIVO,
+                   P.IDCATEGORIA, C.NOMBRE, P.IDUNIDAD, U.SIMBOLO
+            FROM PRODUCTO P
+            JOIN UNIDADMEDIDA U ON P.IDUNIDAD = U.IDUNIDAD
+            JOIN CATEGORIAPRODUCTO C ON P.IDCATEGORIA = C.IDCATEGORIA
+        """)
+
+    def resumen(self):
+        with self._lock:
+            pendientes = len(self._pendientes)
+            completo_pendiente = self._completo_pendiente
+        return {
+            "lista": self.lista,
+            "pendientes": pendientes,
+            "completo_pendiente": completo_pendiente,
+            "edad_segundos": round(time.time() - self.ultimo_refresco, 1) if self.ultimo_refresco else None,
+            "ultimo_error": self.ultimo_error,
+        }
@@ -0,0 +1,45 @@
+-- Esquema base de la aplicación (tal como existe en Oracle Cloud)
+CREATE TABLE USUARIO (
+    IDUSUARIO      NUMBER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    NOMBRE         VARCHAR2(100) NOT NULL,
+    EMAIL          VARCHAR2(255) NOT NULL,
+    PASSWORDHASH   VARCHAR2(255) NOT NULL,
+    FECHAREGISTRO  TIMESTAMP DEFAULT SYSTIMESTAMP,
+    ACTIVO         NUMBER(1) DEFAULT 1,
+    CONSTRAINT UQ_USUARIO_EMAIL UNIQUE (EMAIL)
+);
+
+CREATE TABLE CATEGORIAPRODUCTO (
+    IDCATEGORIA  NUMBER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    NOMBRE       VARCHAR2(100) NOT NULL
+);
+
+CREATE TABLE UNIDADMEDIDA (
+    IDUNIDAD  NUMBER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    NOMBRE    VARCHAR2(50) NOT NULL,
+    SIMBOLO   VARCHAR2(10)
+);
+
+CREATE TABLE PRODUCTO (
+    IDPRODUCTO        NUMBER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    NOMBRE            VARCHAR2(150) NOT NULL,
+    DESCRIPCION       VARCHAR2(500),
+    IDCATEGORIA       NUMBER NOT NULL,
+    IDUNIDAD          NUMBER NOT NULL,
+    CANTIDAD          NUMBER(12, 2) DEFAULT 0,
+    ACTIVO            NUMBER(1) DEFAULT 1,
+    IDUSUARIOCREADOR  NUMBER,
+    CONSTRAINT FK_PRODUCTO_CATEGORIA FOREIGN KEY (IDCATEGORIA) REFERENCES CATEGORIAPRODUCTO (IDCATEGORIA),
+    CONSTRAINT FK_PRODUCTO_UNIDAD FOREIGN KEY (IDUNIDAD) REFERENCES UNIDADMEDIDA (IDUNIDAD),
+    CONSTRAINT FK_PRODUCTO_USUARIO FOREIGN KEY (IDUSUARIOCREADOR) REFERENCES USUARIO (IDUSUARIO)
+);
+
+CREATE TABLE ENVIOCORREO (
+    IDENVIO           NUMBER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    IDUSUARIODESTINO  NUMBER,
+    ASUNTO            VARCHAR2(200),
+    CUERPO            CLOB,
+    FECHAENVIO        TIMESTAMP DEFAULT SYSTIMESTAMP,
+    ENVIADO           NUMBER(1) DEFAULT 0,
+    CONSTRAINT FK_ENVIOCORREO_USUARIO FOREIGN KEY (IDUSUARIODESTINO) REFERENCES USUARIO (IDUSUARIO)
+);
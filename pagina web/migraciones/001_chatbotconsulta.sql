@@ -0,0 +1,14 @@
+-- Bitácora de consultas del chatbot (una fila por pregunta respondida)
+CREATE TABLE CHATBOTCONSULTA (
+    IDCONSULTA   NUMBER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    IDUSUARIO    NUMBER NOT NULL,
+    TIPO         VARCHAR2(20),
+    FILTRO       VARCHAR2(100),
+    TEXTO        VARCHAR2(500),
+    LATENCIAMS   NUMBER(10, 2),
+    RESULTADOS   NUMBER,
+    FECHA        TIMESTAMP DEFAULT SYSTIMESTAMP NOT NULL
+);
+
+-- Historial por usuario paginado por IDCONSULTA (keyset)
+CREATE INDEX IX_CHATBOTCONSULTA_USUARIO ON CHATBOTCONSULTA (IDUSUARIO, IDCONSULTA DESC);
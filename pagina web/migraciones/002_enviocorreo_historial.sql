@@ -0,0 +1,24 @@
+-- Historial de correos: destinatario guardado en la fila, índices para paginar
+-- por fecha y tabla de archivo para la retención.
+ALTER TABLE ENVIOCORREO ADD (EMAILDESTINO VARCHAR2(255));
+
+UPDATE ENVIOCORREO
+SET EMAILDESTINO = (SELECT U.EMAIL FROM USUARIO U WHERE U.IDUSUARIO = ENVIOCORREO.IDUSUARIODESTINO)
+WHERE EMAILDESTINO IS NULL AND IDUSUARIODESTINO IS NOT NULL;
+
+-- Keyset por (FECHAENVIO, IDENVIO) y filtros más usados
+CREATE INDEX IX_ENVIOCORREO_FECHA ON ENVIOCORREO (FECHAENVIO DESC, IDENVIO DESC);
+CREATE INDEX IX_ENVIOCORREO_DESTINO ON ENVIOCORREO (EMAILDESTINO, FECHAENVIO DESC);
+CREATE INDEX IX_ENVIOCORREO_ENVIADO ON ENVIOCORREO (ENVIADO, FECHAENVIO DESC);
+
+-- Filas movidas por el trabajo de retención (mismas columnas, sin índices de escritura)
+CREATE TABLE ENVIOCORREO_HIST (
+    IDENVIO           NUMBER PRIMARY KEY,
+    IDUSUARIODESTINO  NUMBER,
+    EMAILDESTINO      VARCHAR2(255),
+    ASUNTO            VARCHAR2(200),
+    CUERPO            CLOB,
+    FECHAENVIO        TIMESTAMP,
+    ENVIADO           NUMBER(1),
+    FECHAARCHIVO      TIMESTAMP DEFAULT SYSTIMESTAMP
+);
@@ -0,0 +1,14 @@
+-- Índices para las consultas más frecuentes de app.py
+
+-- login / registro de envíos: WHERE EMAIL = :1
+-- (si UQ_USUARIO_EMAIL ya lo cubre, Oracle responde ORA-01408 y se da por aplicado)
+CREATE INDEX IX_USUARIO_EMAIL ON USUARIO (EMAIL);
+
+-- chatbot 'categoria': WHERE IDCATEGORIA = :1 ORDER BY NOMBRE
+CREATE INDEX IX_PRODUCTO_CATEGORIA_NOMBRE ON PRODUCTO (IDCATEGORIA, NOMBRE);
+
+-- chatbot 'activos': WHERE ACTIVO = 1 ORDER BY NOMBRE
+CREATE INDEX IX_PRODUCTO_ACTIVO_NOMBRE ON PRODUCTO (ACTIVO, NOMBRE);
+
+-- joins PRODUCTO -> UNIDADMEDIDA (las FK no crean índice en Oracle)
+CREATE INDEX IX_PRODUCTO_UNIDAD ON PRODUCTO (IDUNIDAD);
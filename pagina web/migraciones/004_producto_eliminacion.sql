@@ -0,0 +1,7 @@
+-- Borrado lógico de productos: la fila queda con FECHAELIMINACION y las lecturas
+-- la ignoran; el trabajo de purga la borra de verdad más tarde, por lotes.
+ALTER TABLE PRODUCTO ADD (FECHAELIMINACION TIMESTAMP);
+
+-- Purga: WHERE FECHAELIMINACION < :1 (Oracle no indexa los NULL, el índice solo
+-- guarda las filas eliminadas)
+CREATE INDEX IX_PRODUCTO_ELIMINACION ON PRODUCTO (FECHAELIMINACION);
@@ -0,0 +1,3 @@
+-- Turnos del chatbot contestados con 304 (el navegador ya tenía la respuesta):
+-- también se anotan para contar bien las consultas más frecuentes.
+ALTER TABLE CHATBOTCONSULTA ADD (REVALIDADA NUMBER(1) DEFAULT 0);
@@ -0,0 +1,132 @@
+import os
+import re
+import sqlite3
+import sys
+
+# --- Migraciones de esquema ---
+# Cada archivo migraciones/NNN_nombre.sql es una versión. Las versiones aplicadas se
+# anotan en SCHEMA_VERSION. Los errores de "ya existe" se toleran para poder correr
+# las migraciones sobre la BD de Oracle Cloud, que ya tiene parte del esquema.
+# Los mismos archivos sirven para una BD SQLite local (pruebas y benchmarks):
+# las sentencias se traducen al vuelo con a_sqlite().
+
+CARPETA_MIGRACIONES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migraciones")
+
+TABLA_VERSIONES = """
+CREATE TABLE SCHEMA_VERSION (
+    VERSION  NUMBER PRIMARY KEY,
+    NOMBRE   VARCHAR2(200) NOT NULL,
+    FECHA    TIMESTAMP DEFAULT SYSTIMESTAMP
+)
+"""
+
+# ORA-00955 nombre ya usado, ORA-01408 columnas ya indexadas, ORA-01430 columna ya existe,
+# ORA-02260/02261 clave ya definida, ORA-02275 FK ya existe
+YA_EXISTE_ORACLE = ("ORA-00955", "ORA-01408", "ORA-01430", "ORA-02260", "ORA-02261", "ORA-02275")
+YA_EXISTE_SQLITE = ("already exists", "duplicate column name")
+
+
+def cargar_migraciones(carpeta=CARPETA_MIGRACIONES):
+    """Devuelve [(version, nombre, [sentencias])] ordenado por versión."""
+    migraciones = []
+    for archivo in sorted(os.listdir(carpeta)):
+        coincide = re.match(r"^(\d+)_(\w+)\.sql$", archivo)
+        if not coincide:
+            continue
+        with open(os.path.join(carpeta, archivo), encoding="utf-8") as f:
+            migraciones.append((int(coincide.group(1)), coincide.group(2), sentencias(f.read())))
+    return migraciones
+
+
+def sentencias(sql):
+    """Parte un script en sentencias (terminadas en ';'), sin comentarios '--'."""
+    lineas = [re.sub(r"--.*$", "", linea) for linea in sql.splitlines()]
+    return [s.strip() for s in "\n".join(lineas).split(";") if s.strip()]
+
+
+def a_sqlite(sentencia):
+    """Traduce el DDL/DML de las migraciones (dialecto Oracle) a SQLite."""
+    s = re.sub(r"NUMBER\s+GENERATED\s+BY\s+DEFAULT\s+AS\s+IDENTITY\s+PRIMARY\s+KEY",
+               "INTEGER PRIMARY KEY AUTOINCREMENT", sentencia, flags=re.I)
+    s = re.sub(r"\bNUMBER\s*\(\s*\d+\s*,\s*\d+\s*\)", "NUMERIC", s, flags=re.I)
+    s = re.sub(r"\bNUMBER\s*\(\s*\d+\s*\)", "INTEGER", s, flags=re.I)
+    s = re.sub(r"\bNUMBER\b", "INTEGER", s, flags=re.I)
+    s = re.sub(r"\bVARCHAR2\b", "VARCHAR", s, flags=re.I)
+    s = re.sub(r"\bCLOB\b", "TEXT", s, flags=re.I)
+    s = re.sub(r"DEFAULT\s+SYSTIMESTAMP\b", "DEFAULT (datetime('now', 'localtime'))", s, flags=re.I)
+    s = re.sub(r"\bSYSTIMESTAMP\b", "datetime('now', 'localtime')", s, flags=re.I)
+    # ALTER TABLE T ADD (COL TIPO) -> ALTER TABLE T ADD COLUMN COL TIPO
+    s = re.sub(r"^(ALTER\s+TABLE\s+\w+\s+ADD)\s*\((.*)\)\s*$", r"\1 COLUMN \2", s, flags=re.I | re.S)
+    return s
+
+
+def _ya_existe(error, dialecto):
+    texto = str(error)
+    marcas = YA_EXISTE_ORACLE if dialecto == "oracle" else YA_EXISTE_SQLITE
+    return any(m in texto for m in marcas)
+
+
+def _ejecutar(cursor, sentencia, dialecto):
+    """Ejecuta una sentencia; devuelve False si el objeto ya existía."""
+    if dialecto == "sqlite":
+        sentencia = a_sqlite(sentencia)
+    try:
+        cursor.execute(sentencia)
+        return True
+    except Exception as e:
+        if _ya_existe(e, dialecto):
+            return False
+        raise
+
+
+def versiones_aplicadas(conn, dialecto):
+    cursor = conn.cursor()
+    _ejecutar(cursor, TABLA_VERSIONES, dialecto)
+    cursor.execute("SELECT VERSION FROM SCHEMA_VERSION")
+    aplicadas = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+    return aplicadas
+
+
+def aplicar_migraciones(conn, dialecto="oracle", carpeta=CARPETA_MIGRACIONES, hasta=None):
+    """
+    Aplica en orden las versiones pendientes (hasta `hasta`, si se indica).
+    Se puede correr varias veces: lo aplicado se salta y lo que ya existe se tolera.
+    Devuelve [(version, nombre)] de lo aplicado en esta corrida.
+    """
+    aplicadas = versiones_aplicadas(conn, dialecto)
+    marca = ":1, :2" if dialecto == "oracle" else "?, ?"
+    hechas = []
+    for version, nombre, lista in cargar_migraciones(carpeta):
+        if version in aplicadas or (hasta is not None and version > hasta):
+            continue
+        cursor = conn.cursor()
+        for sentencia in lista:
+            _ejecutar(cursor, sentencia, dialecto)
+        cursor.execute(f"INSERT INTO SCHEMA_VERSION (VERSION, NOMBRE) VALUES ({marca})", (version, nombre))
+        conn.commit()
+        cursor.close()
+        hechas.append((version, nombre))
+    return hechas
+
+
+def crear_bd_local(ruta):
+    """Crea (o pone al día) una BD SQLite con el mismo esquema que Oracle."""
+    conn = sqlite3.connect(ruta)
+    conn.execute("PRAGMA foreign_keys=ON")
+    hechas = aplicar_migraciones(conn, "sqlite")
+    return conn, hechas
+
+
+if __name__ == "__main__":
+    # python migrar.py ruta.sqlite3  -> esquema en una BD local
+    # (para Oracle Cloud: flask --app app migrar)
+    if len(sys.argv) != 2:
+        print("Uso: python migrar.py <archivo.sqlite3>")
+        raise SystemExit(2)
+    conn, hechas = crear_bd_local(sys.argv[1])
+    conn.close()
+    for version, nombre in hechas:
+        print(f"✅ {version:03d} {nombre}")
+    if not hechas:
+        print("La BD local ya estaba al día.")
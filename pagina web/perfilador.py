@@ -0,0 +1,218 @@
+import queue
+import re
+import threading
+import time
+from collections import deque
+
+# --- Perfilador de SQL ---
+# Envuelve conexiones y cursores para medir cada sentencia: tiempo, filas leídas
+# y viajes a la BD. Las sentencias que pasan el umbral quedan en la bitácora de
+# lentas con la forma de sus binds (tipos, no valores) y, si se pide, su plan.
+# Los planes se piden en un hilo aparte, con su propia conexión: la petición que
+# disparó la sentencia lenta no espera el EXPLAIN ni comparte su transacción.
+
+
+def normalizar_sql(sql):
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def forma_binds(params):
+    """Tipos (y largo de los textos) de los binds, sin exponer los valores."""
+    def forma(valor):
+        if isinstance(valor, str):
+            return f"str({len(valor)})"
+        return type(valor).__name__
+    if params is None:
+        return "[]"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}: {forma(v)}" for k, v in params.items()) + "}"
+    return "[" + ", ".join(forma(v) for v in params) + "]"
+
+
+class Perfilador:
+
+    def __init__(self, umbral_ms=200, explicar=None, max_lentas=100, al_medir=None, max_planes_pendientes=20):
+        """
+        explicar(sql, params) -> [líneas del plan] o None para no capturar planes. Corre en
+        el hilo de planes y debe usar su propia conexión.
+        al_medir(medicion) se llama tras cada sentencia (p. ej. para el resumen por petición).
+        """
+        self.umbral_ms = umbral_ms
+        self.explicar = explicar
+        self.al_medir = al_medir
+        self.estadisticas = {}
+        self.lentas = deque(maxlen=max_lentas)
+        self.planes = {}
+        self._lock = threading.Lock()
+        self._planes_pendientes = queue.Queue(maxsize=max_planes_pendientes)
+        self._en_cola = set()
+        self._hilo_planes = None
+
+    def envolver(self, conn):
+        return ConexionPerfilada(conn, self)
+
+    def registrar(self, sql, params, ms, filas, viajes, muchas=False):
+        clave = normalizar_sql(sql)
+        with self._lock:
+            e = self.estadisticas.setdefault(clave, {"llamadas": 0, "ms_total": 0.0, "ms_max": 0.0, "filas": 0, "viajes": 0})
+            e["llamadas"] += 1
+            e["ms_total"] += ms
+            e["ms_max"] = max(e["ms_max"], ms)
+            e["filas"] += filas
+            e["viajes"] += viajes
+
+        medicion = {"sql": clave, "ms": round(ms, 2), "filas": filas, "viajes": viajes}
+        if ms >= self.umbral_ms:
+            medicion["binds"] = f"executemany x {len(params)}" if muchas else forma_binds(params)
+            medicion["plan"] = self._plan(sql, params, clave) if not muchas else None
+            self.lentas.append(dict(medicion, instante=time.time()))
+            print(f"🐢 SQL lento ({medicion['ms']} ms, {filas} filas, binds {medicion['binds']}): {clave[:300]}")
+        if self.al_medir:
+            self.al_medir(medicion)
+
+    def _plan(self, sql, params, clave):
+        """Plan ya capturado de la sentencia, o None; si falta, lo encarga al hilo de planes."""
+        # Un plan por sentencia distinta, y solo para consultas
+        if self.explicar is None or not re.match(r"\s*(SELECT|WITH)\b", sql, re.I):
+            return None
+        with self._lock:
+            if clave in self.planes:
+                return self.planes[clave]
+            if clave in self._en_cola:
+                return None
+            if self._hilo_planes is None:
+                self._hilo_planes = threading.Thread(target=self._bucle_planes, name="planes-sql", daemon=True)
+                self._hilo_planes.start()
+            if isinstance(params, dict):
+                params = dict(params)
+            elif params is not None:
+                params = list(params)
+            try:
+                self._planes_pendientes.put_nowait((clave, sql, params))
+            except queue.Full:
+                # Cola llena: se vuelve a pedir la próxima vez que la sentencia sea lenta
+                return None
+            self._en_cola.add(clave)
+        return None
+
+    def _bucle_planes(self):
+        while True:
+            clave, sql, params = self._planes_pendientes.get()
+            try:
+                plan = self.explicar(sql, params)
+            except Exception as e:
+                plan = [f"(no se pudo obtener el plan: {e})"]
+            with self._lock:
+                self.planes[clave] = plan
+                self._en_cola.discard(clave)
+
+    def resumen(self, top=20):
+        with self._lock:
+            filas = sorted(self.estadisticas.items(), key=lambda kv: -kv[1]["ms_total"])[:top]
+            return {
+                "umbral_ms": self.umbral_ms,
+                "sentencias": [
+                    dict(e, sql=sql, ms_total=round(e["ms_total"], 2), ms_max=round(e["ms_max"], 2),
+                         ms_promedio=round(e["ms_total"] / e["llamadas"], 2))
+                    for sql, e in filas
+                ],
+                # El plan suele llegar después que la medición
+                "lentas": [dict(lenta, plan=self.planes.get(lenta["sql"], lenta.get("plan")))
+                           for lenta in self.lentas],
+            }
+
+
+class CursorPerfilado:
+    def __init__(self, cursor, perfilador):
+        self._cursor = cursor
+        self._perfilador = perfilador
+        self._medicion = None
+
+    @property
+    def arraysize(self):
+        return self._cursor.arraysize
+
+    @arraysize.setter
+    def arraysize(self, valor):
+        self._cursor.arraysize = valor
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+    def _cerrar_medicion(self):
+        # La sentencia anterior termina cuando se ejecuta otra o se cierra el cursor
+        if self._medicion is not None:
+            m, self._medicion = self._medicion, None
+            self._perfilador.registrar(m["sql"], m["params"], m["ms"], m["filas"], m["viajes"])
+
+    def execute(self, sql, params=None):
+        self._cerrar_medicion()
+        inicio = time.perf_counter()
+        if params is None:
+            resultado = self._cursor.execute(sql)
+        else:
+            resultado = self._cursor.execute(sql, params)
+        self._medicion = {"sql": sql, "params": params, "ms": (time.perf_counter() - inicio) * 1000,
+                          "filas": 0, "viajes": 1}
+        return resultado
+
+    def executemany(self, sql, filas):
+        self._cerrar_medicion()
+        filas = list(filas)
+        inicio = time.perf_counter()
+        resultado = self._cursor.executemany(sql, filas)
+        ms = (time.perf_counter() - inicio) * 1000
+        self._perfilador.registrar(sql, filas, ms, 0, 1, muchas=True)
+        return resultado
+
+    def _medir_fetch(self, funcion, *args):
+        inicio = time.perf_counter()
+        resultado = funcion(*args)
+        if self._medicion is not None:
+            self._medicion["ms"] += (time.perf_counter() - inicio) * 1000
+            n = len(resultado) if isinstance(resultado, list) else (1 if resultado is not None else 0)
+            self._medicion["filas"] += n
+            # Estimado: cada arraysize filas es un viaje más (la primera tanda viene con el execute)
+            self._medicion["viajes"] += max(0, n - 1) // max(self._cursor.arraysize, 1)
+        return resultado
+
+    def fetchone(self):
+        return self._medir_fetch(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._medir_fetch(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._medir_fetch(self._cursor.fetchall)
+
+    def close(self):
+        self._cerrar_medicion()
+        self._cursor.close()
+
+
+class ConexionPerfilada:
+    def __init__(self, conn, perfilador):
+        self._conn = conn
+        self._perfilador = perfilador
+        self._cursores = []
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+    def __setattr__(self, nombre, valor):
+        if nombre.startswith("_"):
+            object.__setattr__(self, nombre, valor)
+        else:
+            setattr(self._conn, nombre, valor)
+
+    def cursor(self):
+        cursor = CursorPerfilado(self._conn.cursor(), self._perfilador)
+        self._cursores.append(cursor)
+        return cursor
+
+    def close(self):
+        # Cursores que el código no cerró: se registra lo que midieron
+        for cursor in self._cursores:
+            cursor._cerrar_medicion()
+        self._cursores = []
+        self._conn.close()
@@ -0,0 +1,19 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# Los módulos de la app viven en "pagina web/" (no es un paquete)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app_mod(tmp_path_factory):
+    # app.py lee la configuración al importarse: BD SQLite local, sin instantánea ni perfilado
+    ruta = str(tmp_path_factory.mktemp("bd") / "local.sqlite3")
+    os.environ.update(DB_BACKEND="sqlite", DB_SQLITE_RUTA=ruta, SNAPSHOT_ACTIVO="0",
+                      PERFIL_SQL="0", FLASK_SECRET_KEY="pruebas")
+    modulo = importlib.import_module("app")
+    assert modulo.DB_SQLITE_RUTA == ruta
+    return modulo
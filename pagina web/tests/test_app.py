@@ -0,0 +1,399 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(app_mod, monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(app_mod.time, "monotonic", reloj)
+    return reloj
+
+
+
+# --- /readyz ---
+
+@pytest.fixture
+def bd_caida(app_mod, monkeypatch):
+    monkeypatch.setattr(app_mod, "sondear_bd", lambda: {"ok": False, "error": "caída", "latencia_ms": 1})
+    monkeypatch.setattr(app_mod, "sondear_smtp", lambda: {"ok": True, "latencia_ms": 1})
+    monkeypatch.setattr(app_mod, "_sondas_cache", {})
+    monkeypatch.setattr(app_mod, "_ultimas_lecturas", app_mod.OrderedDict())
+
+
+def test_readyz_sin_bd_ni_respaldo_no_esta_listo(app_mod, bd_caida):
+    resp = app_mod.app.test_client().get('/readyz')
+    assert resp.status_code == 503
+    assert resp.get_json() == {"ok": False, "degradado": False, "bd": "abajo", "smtp": "arriba"}
+
+
+def test_readyz_sin_bd_con_respaldo_sigue_listo(app_mod, bd_caida):
+    app_mod.guardar_lectura(("categorias",), [(1, "Quesos")])
+    resp = app_mod.app.test_client().get('/readyz')
+    assert resp.status_code == 200
+    assert resp.get_json() == {"ok": True, "degradado": True, "bd": "abajo", "smtp": "arriba"}
+
+
+# --- ETag del catálogo ---
+
+def test_etag_caduca_con_la_ventana(app_mod, monkeypatch):
+    # Cambios hechos fuera del proceso no suben la versión: la ventana los acota
+    monkeypatch.setattr(app_mod, "ETAG_VIGENCIA", 60)
+    ahora = [6000.0]
+    monkeypatch.setattr(app_mod.time, "time", lambda: ahora[0])
+    etag = app_mod.etag_catalogo("categorias")
+    ahora[0] += 59
+    assert app_mod.etag_catalogo("categorias") == etag
+    ahora[0] += 1
+    assert app_mod.etag_catalogo("categorias") != etag
+
+
+@pytest.fixture
+def cliente(app_mod, monkeypatch):
+    # Sin ventana de caducidad: los ETag solo cambian con la versión del catálogo
+    monkeypatch.setattr(app_mod, "ETAG_VIGENCIA", 0)
+    monkeypatch.setattr(app_mod, "_ultimas_lecturas", app_mod.OrderedDict())
+    cliente = app_mod.app.test_client()
+    with cliente.session_transaction() as s:
+        s['idusuario'] = 1
+    return cliente
+
+
+def test_etag_304_si_no_cambio(cliente):
+    resp = cliente.get('/categorias')
+    assert resp.status_code == 200
+    etag = resp.headers["ETag"]
+    assert resp.headers["Cache-Control"] == "private, no-cache"
+    resp = cliente.get('/categorias', headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+    assert resp.get_data() == b""
+
+
+def test_etag_cambia_tras_notificar_cambio(app_mod, cliente):
+    etag = cliente.get('/categorias').headers["ETag"]
+    app_mod.notificar_cambio_catalogo(1)
+    resp = cliente.get('/categorias', headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+
+
+def test_respuesta_degradada_sin_etag(app_mod, cliente, monkeypatch):
+    assert cliente.get('/categorias').status_code == 200
+
+    def bd_caida():
+        raise sqlite3.OperationalError("unable to open database file")
+    monkeypatch.setattr(app_mod, "_consultar_categorias", bd_caida)
+    resp = cliente.get('/categorias')
+    assert resp.status_code == 200
+    assert resp.get_json()["degradado"] is True
+    assert "ETag" not in resp.headers
+    assert resp.headers["Cache-Control"].startswith("no-store")
+
+# --- Cortacircuitos ---
+
+def test_circuito_se_abre_tras_fallos_seguidos(app_mod, reloj):
+    circuito = app_mod.Cortacircuitos("Prueba", fallos_max=3, espera=10)
+    for _ in range(2):
+        circuito.antes()
+        circuito.fallo(RuntimeError("caída"))
+    assert circuito.estado == "cerrado"
+    circuito.fallo(RuntimeError("caída"))
+    assert circuito.estado == "abierto"
+    with pytest.raises(app_mod.CircuitoAbierto):
+        circuito.antes()
+    assert circuito.resumen()["ultimo_error"] == "caída"
+
+
+def test_circuito_exito_reinicia_la_cuenta(app_mod, reloj):
+    circuito = app_mod.Cortacircuitos("Prueba", fallos_max=2, espera=10)
+    circuito.fallo(RuntimeError("x"))
+    circuito.exito()
+    circuito.fallo(RuntimeError("x"))
+    assert circuito.estado == "cerrado"
+
+
+def test_circuito_semiabierto_deja_una_sola_prueba(app_mod, reloj):
+    circuito = app_mod.Cortacircuitos("Prueba", fallos_max=1, espera=10)
+    circuito.fallo(RuntimeError("x"))
+    reloj.ahora += 10
+    circuito.antes()
+    assert circuito.estado == "semiabierto"
+    with pytest.raises(app_mod.CircuitoAbierto):
+        circuito.antes()
+    circuito.exito()
+    assert circuito.estado == "cerrado"
+    circuito.antes()
+
+
+def test_circuito_prueba_fallida_vuelve_a_abrir(app_mod, reloj):
+    circuito = app_mod.Cortacircuitos("Prueba", fallos_max=3, espera=10)
+    for _ in range(3):
+        circuito.fallo(RuntimeError("x"))
+    reloj.ahora += 10
+    circuito.antes()
+    circuito.fallo(RuntimeError("sigue caída"))
+    assert circuito.estado == "abierto"
+    reloj.ahora += 5
+    with pytest.raises(app_mod.CircuitoAbierto):
+        circuito.antes()
+
+
+def test_circuito_prueba_sin_respuesta_libera_otra(app_mod, reloj):
+    circuito = app_mod.Cortacircuitos("Prueba", fallos_max=1, espera=10)
+    circuito.fallo(RuntimeError("x"))
+    reloj.ahora += 10
+    circuito.antes()
+    reloj.ahora += 10
+    circuito.antes()
+    assert circuito.estado == "semiabierto"
+
+
+# --- Cubeta de fichas ---
+
+def test_cubeta_descuenta_y_recarga(app_mod, reloj):
+    clave = "prueba-cubeta"
+    for _ in range(3):
+        assert app_mod.tomar_fichas(clave, capacidad=3, recarga=1) == 0
+    assert app_mod.tomar_fichas(clave, capacidad=3, recarga=1) == pytest.approx(1)
+    reloj.ahora += 0.5
+    assert app_mod.tomar_fichas(clave, capacidad=3, recarga=1) == pytest.approx(0.5)
+    reloj.ahora += 0.5
+    assert app_mod.tomar_fichas(clave, capacidad=3, recarga=1) == 0
+
+
+def test_cubeta_no_pasa_de_la_capacidad(app_mod, reloj):
+    clave = "prueba-capacidad"
+    assert app_mod.tomar_fichas(clave, capacidad=2, recarga=1, costo=2) == 0
+    reloj.ahora += 100
+    assert app_mod.tomar_fichas(clave, capacidad=2, recarga=1, costo=2) == 0
+    assert app_mod.tomar_fichas(clave, capacidad=2, recarga=1, costo=2) == pytest.approx(2)
+
+
+def test_cubeta_costo_mayor_que_capacidad_espera(app_mod, reloj):
+    espera = app_mod.tomar_fichas("prueba-costo", capacidad=2, recarga=2, costo=5)
+    assert espera == pytest.approx(1.5)
+
+
+
+# --- Compartimentos ---
+
+def test_envio_de_correo_no_ocupa_cupo_de_bd(app_mod, monkeypatch):
+    durante = []
+
+    def enviar(*args):
+        durante.append({n: c["en_uso"] for n, c in app_mod.estado_admision()["compartimentos"].items()})
+    monkeypatch.setattr(app_mod, "enviar_correo_gmail", enviar)
+    cliente = app_mod.app.test_client()
+    with cliente.session_transaction() as s:
+        s['idusuario'] = 1
+    resp = cliente.post('/correo', data={"email_destino": "a@x.cl", "asunto": "Hola", "cuerpo": "Prueba"})
+    assert resp.status_code == 200
+    assert durante == [{"bd": 0, "smtp": 1}]
+    assert app_mod.estado_admision()["compartimentos"]["smtp"]["en_uso"] == 0
+
+# --- Historial de correos (keyset sobre el esquema local) ---
+
+@pytest.fixture
+def envios(app_mod):
+    conn = sqlite3.connect(app_mod.DB_SQLITE_RUTA)
+    conn.execute("DELETE FROM ENVIOCORREO")
+    # Varias filas con la misma fecha: el desempate por IDENVIO no debe saltarse ni repetir ninguna
+    filas = [(i, f"c{i % 3}@x.cl", f"Asunto {i}", datetime(2026, 1, 1 + i // 4, 12, 0), i % 2)
+             for i in range(1, 24)]
+    conn.executemany("""
+        INSERT INTO ENVIOCORREO (IDENVIO, EMAILDESTINO, ASUNTO, CUERPO, FECHAENVIO, ENVIADO)
+        VALUES (?, ?, ?, '', ?, ?)
+    """, filas)
+    conn.commit()
+    conn.close()
+    return filas
+
+
+def recorrer(app_mod, **filtros):
+    vistos, antes = [], None
+    while True:
+        pagina, antes = app_mod.buscar_historial_correos(limite=5, antes=antes, **filtros)
+        vistos += [f["id"] for f in pagina]
+        if not antes:
+            return vistos
+
+
+def test_historial_keyset_recorre_todo_en_orden(app_mod, envios):
+    esperado = [i for i, *_ in sorted(envios, key=lambda f: (f[3], f[0]), reverse=True)]
+    assert recorrer(app_mod) == esperado
+
+
+def test_historial_keyset_con_filtros(app_mod, envios):
+    esperado = [i for i, destino, _, fecha, enviado in sorted(envios, key=lambda f: (f[3], f[0]), reverse=True)
+                if destino == "c1@x.cl" and enviado == 0]
+    assert esperado
+    assert recorrer(app_mod, destino="c1@x.cl", enviado=False) == esperado
+
+
+def test_historial_cursor_invalido(app_mod, envios):
+    with pytest.raises(app_mod.CursorInvalido):
+        app_mod.buscar_historial_correos(antes="no-es-fecha|3")
+    with pytest.raises(app_mod.CursorInvalido):
+        app_mod.buscar_historial_correos(antes="2026-01-01T12:00:00|x")
+
+
+# --- Borrado lógico y purga de productos ---
+
+def test_leer_horas_purga(app_mod):
+    assert app_mod.leer_horas_purga("22-4") == (22, 4)
+    for malo in ("2a5", "2", "3-24", ""):
+        with pytest.raises(ValueError):
+            app_mod.leer_horas_purga(malo)
+
+
+def test_eliminar_lote_rechaza_ids_no_enteros(app_mod):
+    cliente = app_mod.app.test_client()
+    with cliente.session_transaction() as s:
+        s['idusuario'] = 1
+    for ids in ([1.5], ["3"], [True], 7, [0]):
+        resp = cliente.post('/producto/eliminar_lote', json={"ids": ids})
+        assert resp.status_code == 400, ids
+    for cuerpo in ([1, 2], "ids", 5):
+        resp = cliente.post('/producto/eliminar_lote', json=cuerpo)
+        assert resp.status_code == 400, cuerpo
+
+
+@pytest.fixture
+def papelera(app_mod, monkeypatch):
+    """Cinco productos eliminados hace 60 días; el 3 sigue referenciado por otra tabla."""
+    monkeypatch.setattr(app_mod, "_no_purgables", {})
+    conn = sqlite3.connect(app_mod.DB_SQLITE_RUTA)
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute("CREATE TABLE IF NOT EXISTS PEDIDO_PRUEBA (IDPRODUCTO INTEGER REFERENCES PRODUCTO (IDPRODUCTO))")
+    conn.execute("DELETE FROM PEDIDO_PRUEBA")
+    conn.execute("DELETE FROM PRODUCTO")
+    conn.execute("INSERT OR IGNORE INTO CATEGORIAPRODUCTO (IDCATEGORIA, NOMBRE) VALUES (1, 'Quesos')")
+    conn.execute("INSERT OR IGNORE INTO UNIDADMEDIDA (IDUNIDAD, NOMBRE, SIMBOLO) VALUES (1, 'Kilogramo', 'kg')")
+    conn.executemany("""
+        INSERT INTO PRODUCTO (IDPRODUCTO, NOMBRE, IDCATEGORIA, IDUNIDAD, ACTIVO, FECHAELIMINACION)
+        VALUES (?, ?, 1, 1, 1, datetime('now', '-60 days'))
+    """, [(i, f"Queso {i}") for i in range(1, 6)])
+    conn.execute("INSERT INTO PEDIDO_PRUEBA VALUES (3)")
+    conn.commit()
+    yield conn
+    conn.execute("DELETE FROM PEDIDO_PRUEBA")
+    conn.commit()
+    conn.close()
+
+
+def restantes(conn):
+    return [r[0] for r in conn.execute("SELECT IDPRODUCTO FROM PRODUCTO ORDER BY IDPRODUCTO")]
+
+
+def test_purga_salta_los_referenciados(app_mod, papelera, monkeypatch):
+    monkeypatch.setattr(app_mod.time, "sleep", lambda s: None)
+    assert app_mod.purgar_productos(dias=30, lote=2) == 4
+    assert restantes(papelera) == [3]
+    assert set(app_mod._no_purgables) == {3}
+
+    # La conexión SQLite del hilo es la misma que usa purgar_productos: se ven sus sentencias
+    intentos = []
+    conn = app_mod.backend_bd.conectar()._conn
+    conn.set_trace_callback(intentos.append)
+    try:
+        assert app_mod.purgar_productos(dias=30, lote=2) == 0
+    finally:
+        conn.set_trace_callback(None)
+    assert not [sql for sql in intentos if "DELETE" in sql]
+
+
+def test_purga_se_corta_fuera_de_la_ventana(app_mod, papelera, monkeypatch):
+    monkeypatch.setattr(app_mod.time, "sleep", lambda s: None)
+    permisos = iter([True, False])
+    assert app_mod.purgar_productos(dias=30, lote=2, seguir=lambda: next(permisos)) == 2
+    assert restantes(papelera) == [3, 4, 5]
+
+
+# --- Historial del chatbot ---
+
+def test_historial_chatbot_cursor_invalido(app_mod, cliente):
+    for antes in ("abc", "1.5", "²"):
+        resp = cliente.get(f'/chatbot/historial?antes={antes}')
+        assert resp.status_code == 400, antes
+        assert resp.get_json()["ok"] is False
+
+
+@pytest.fixture
+def bitacora(app_mod, monkeypatch):
+    monkeypatch.setattr(app_mod, "_bitacora_chat", [])
+    monkeypatch.setattr(app_mod, "_bitacora_chat_descartadas", 0)
+    conn = sqlite3.connect(app_mod.DB_SQLITE_RUTA)
+    conn.execute("DELETE FROM CHATBOTCONSULTA")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def consultas_guardadas(conn):
+    return conn.execute("SELECT IDUSUARIO, TEXTO, REVALIDADA FROM CHATBOTCONSULTA ORDER BY IDCONSULTA").fetchall()
+
+
+def sin_conexion():
+    raise sqlite3.OperationalError("unable to open database file")
+
+
+def test_bitacora_vuelca_en_lote(app_mod, bitacora):
+    app_mod.registrar_turno_chat(1, "texto", None, "¿hay queso?", 12.345, 3)
+    app_mod.registrar_turno_chat(1, "todos", None, None, 1, None, revalidada=True)
+    assert app_mod.volcar_bitacora_chat() == 2
+    assert consultas_guardadas(bitacora) == [(1, "¿hay queso?", 0), (1, None, 1)]
+    assert app_mod._bitacora_chat == []
+    assert app_mod.volcar_bitacora_chat() == 0
+
+
+def test_bitacora_reencola_si_falla(app_mod, bitacora, monkeypatch):
+    app_mod.registrar_turno_chat(1, "texto", None, "primera", 1, 0)
+    conectar = app_mod.get_db_connection
+    monkeypatch.setattr(app_mod, "get_db_connection", sin_conexion)
+    with pytest.raises(sqlite3.OperationalError):
+        app_mod.volcar_bitacora_chat()
+    app_mod.registrar_turno_chat(1, "texto", None, "segunda", 1, 0)
+    assert [fila[3] for fila in app_mod._bitacora_chat] == ["primera", "segunda"]
+
+    monkeypatch.setattr(app_mod, "get_db_connection", conectar)
+    assert app_mod.volcar_bitacora_chat() == 2
+    assert [fila[1] for fila in consultas_guardadas(bitacora)] == ["primera", "segunda"]
+
+
+def test_bitacora_descarta_las_mas_viejas_sobre_el_tope(app_mod, bitacora, monkeypatch):
+    monkeypatch.setattr(app_mod, "CHAT_LOG_MAX_PENDIENTES", 3)
+    monkeypatch.setattr(app_mod, "get_db_connection", sin_conexion)
+    for n in range(5):
+        app_mod.registrar_turno_chat(1, "texto", None, f"t{n}", 1, 0)
+    with pytest.raises(sqlite3.OperationalError):
+        app_mod.volcar_bitacora_chat()
+    assert [fila[3] for fila in app_mod._bitacora_chat] == ["t2", "t3", "t4"]
+    assert app_mod._bitacora_chat_descartadas == 2
+
+
+def test_historial_chatbot_keyset(app_mod, bitacora, cliente):
+    for n in range(7):
+        app_mod.registrar_turno_chat(1, "texto", None, f"mía {n}", 1, 0)
+        app_mod.registrar_turno_chat(2, "texto", None, f"ajena {n}", 1, 0)
+    app_mod.volcar_bitacora_chat()
+
+    textos, antes = [], None
+    while True:
+        url = '/chatbot/historial?limite=3' + (f'&antes={antes}' if antes else '')
+        datos = cliente.get(url).get_json()
+        assert datos["ok"]
+        textos += [c["texto"] for c in datos["consultas"]]
+        antes = datos["siguiente"]
+        if antes is None:
+            break
+    assert textos == [f"mía {n}" for n in reversed(range(7))]
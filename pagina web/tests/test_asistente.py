@@ -0,0 +1,101 @@
+from asistente import IndiceProductos, interpretar, raiz
+
+CATEGORIAS = [(1, "Quesos"), (2, "Quesos frescos"), (3, "Yogures")]
+UNIDADES = [(1, "Kilogramo", "kg"), (2, "Litro", "L")]
+
+
+def fila(idproducto, nombre, idcategoria, activo=1, idunidad=1, descripcion=""):
+    categoria = dict(CATEGORIAS)[idcategoria]
+    simbolo = {1: "kg", 2: "L"}[idunidad]
+    return (idproducto, nombre, descripcion, 10, activo, idcategoria, categoria, idunidad, simbolo)
+
+
+def indice_de_prueba():
+    indice = IndiceProductos()
+    indice.cargar([
+        fila(1, "Queso fresco 1", 1),
+        fila(2, "Queso fresco 2", 1),
+        fila(3, "Queso maduro 3", 1),
+        fila(4, "Cuajada fresco 4", 2),
+        fila(5, "Cuajada maduro 5", 2),
+        fila(6, "Yogur fresco 6", 3),
+        fila(7, "Yogur griego 7", 3, activo=0, idunidad=2),
+    ], CATEGORIAS, UNIDADES)
+    return indice
+
+
+def preguntar(indice, texto, limite=20):
+    filtros = interpretar(texto, indice.categorias, indice.unidades)
+    filas, total = indice.buscar(filtros, limite)
+    return filtros, [f[0] for f in filas], total
+
+
+def test_raiz_singulariza():
+    assert raiz("quesos") == "queso"
+    assert raiz("yogures") == "yogur"
+    assert raiz("frescos") == "fresco"
+
+
+def test_interpretar_cantidad_y_palabras():
+    filtros = interpretar("¿Cuánto queso fresco hay?", CATEGORIAS, UNIDADES)
+    assert filtros["intencion"] == "cantidad"
+    assert filtros["activo"] is None
+    assert filtros["idcategoria"] == 2
+    # Las palabras de la categoría siguen sirviendo para buscar en el nombre
+    assert filtros["palabras"] == ["queso", "fresco"]
+
+
+def test_interpretar_inactivos_y_unidad():
+    filtros = interpretar("productos inactivos en litros", CATEGORIAS, UNIDADES)
+    assert filtros["activo"] is False
+    assert filtros["idunidad"] == 2
+    assert filtros["palabras"] == []
+
+
+def test_queso_fresco_no_se_pierde_por_la_categoria():
+    _, ids, total = preguntar(indice_de_prueba(), "¿cuánto queso fresco hay?")
+    # Los "Queso fresco" de la categoría "Quesos" primero, luego lo de "Quesos frescos"
+    assert ids[:2] == [1, 2]
+    assert set(ids) == {1, 2, 4, 5}
+    assert total == 4
+    # Lo que solo tiene una de las palabras no entra
+    assert 3 not in ids and 6 not in ids
+
+
+def test_sin_producto_que_cubra_todo_devuelve_los_mejores():
+    _, ids, _ = preguntar(indice_de_prueba(), "queso griego")
+    assert ids  # nadie tiene las dos palabras: se contesta con los que tienen una
+    assert set(ids) <= {1, 2, 3, 4, 5, 7}
+
+
+def test_filtros_activo_y_unidad():
+    _, ids, _ = preguntar(indice_de_prueba(), "yogur inactivo")
+    assert ids == [7]
+    _, ids, _ = preguntar(indice_de_prueba(), "yogur en kg")
+    assert ids == [6]
+
+
+def test_limite_y_total():
+    _, ids, total = preguntar(indice_de_prueba(), "queso", limite=2)
+    assert len(ids) == 2
+    assert total == 5
+
+
+def test_actualizar_reemplaza_y_borra():
+    indice = indice_de_prueba()
+    indice.actualizar([fila(1, "Mantequilla 1", 1)], [1, 2])
+    _, ids, _ = preguntar(indice, "queso fresco")
+    assert 1 not in ids and 2 not in ids
+    _, ids, _ = preguntar(indice, "mantequilla")
+    assert ids == [1]
+
+
+def test_cambios_durante_la_carga_quedan_pendientes():
+    indice = indice_de_prueba()
+    indice.iniciar_carga()
+    indice.marcar_cambio(3)
+    indice.tomar_pendientes()  # una actualización por ids los toma mientras se carga
+    indice.cargar([fila(3, "Queso maduro 3", 1)], CATEGORIAS, UNIDADES)
+    completo, ids = indice.tomar_pendientes()
+    assert completo is False
+    assert ids == [3]
@@ -0,0 +1,29 @@
+from bd import BackendSQLite, traducir_sql
+from migrar import crear_bd_local
+
+
+def test_traducir_sql_marcadores_y_funciones():
+    assert traducir_sql("SELECT * FROM T WHERE A = :1 AND B = :2") == \
+        "SELECT * FROM T WHERE A = ?1 AND B = ?2"
+    assert traducir_sql("SELECT SYSTIMESTAMP FROM DUAL") == "SELECT datetime('now', 'localtime')"
+    assert traducir_sql("SELECT A FROM T ORDER BY A fetch first 20 rows only") == \
+        "SELECT A FROM T ORDER BY A LIMIT 20"
+
+
+def test_traducir_sql_respeta_binds_con_nombre():
+    sql = "SELECT A FROM T WHERE F < :fecha AND ID = :10"
+    assert traducir_sql(sql) == "SELECT A FROM T WHERE F < :fecha AND ID = ?10"
+
+
+def test_backend_sqlite_insertar_devuelve_id(tmp_path):
+    ruta = str(tmp_path / "local.sqlite3")
+    crear_bd_local(ruta)[0].close()
+    backend = BackendSQLite(ruta)
+    conn = backend.conectar()
+    cursor = conn.cursor()
+    ids = [backend.insertar(cursor, """
+        INSERT INTO ENVIOCORREO (EMAILDESTINO, ASUNTO, CUERPO, FECHAENVIO, ENVIADO)
+        VALUES (:1, :2, :3, SYSTIMESTAMP, :4)
+    """, (f"c{i}@x.cl", "Hola", "", 1), "IDENVIO") for i in range(3)]
+    conn.commit()
+    assert ids == sorted(ids) and len(set(ids)) == 3
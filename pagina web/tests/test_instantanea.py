@@ -0,0 +1,163 @@
+import sqlite3
+
+import pytest
+
+from bd import BackendSQLite
+from instantanea import InstantaneaCatalogo, InstantaneaNoDisponible
+from migrar import crear_bd_local
+
+
+@pytest.fixture
+def origen(tmp_path):
+    """BD de origen (el papel de Oracle) con dos categorías y tres productos."""
+    ruta = str(tmp_path / "origen.sqlite3")
+    conn, _ = crear_bd_local(ruta)
+    conn.executemany("INSERT INTO CATEGORIAPRODUCTO (IDCATEGORIA, NOMBRE) VALUES (?, ?)",
+                     [(1, "Quesos"), (2, "Yogures")])
+    conn.execute("INSERT INTO UNIDADMEDIDA (IDUNIDAD, NOMBRE, SIMBOLO) VALUES (1, 'Kilogramo', 'kg')")
+    conn.executemany("""
+        INSERT INTO PRODUCTO (IDPRODUCTO, NOMBRE, DESCRIPCION, IDCATEGORIA, IDUNIDAD, CANTIDAD, ACTIVO)
+        VALUES (?, ?, '', ?, 1, 10, 1)
+    """, [(1, "Queso fresco", 1), (2, "Queso maduro", 1), (3, "Yogur natural", 2)])
+    conn.commit()
+    yield conn, BackendSQLite(ruta)
+    conn.close()
+
+
+@pytest.fixture
+def copia(origen, tmp_path):
+    _, backend = origen
+    instantanea = InstantaneaCatalogo(str(tmp_path / "copia.sqlite3"), backend.conectar)
+    instantanea.refrescar()
+    return instantanea
+
+
+def nombres(instantanea):
+    return {fila[0]: fila[1] for fila in instantanea.productos_dashboard()}
+
+
+def test_sin_copia_no_hay_lecturas(origen, tmp_path):
+    _, backend = origen
+    instantanea = InstantaneaCatalogo(str(tmp_path / "vacia.sqlite3"), backend.conectar)
+    assert not instantanea.al_dia()
+    with pytest.raises(InstantaneaNoDisponible):
+        instantanea.categorias()
+
+
+def test_copia_completa(copia):
+    assert copia.al_dia()
+    assert nombres(copia) == {1: "Queso fresco", 2: "Queso maduro", 3: "Yogur natural"}
+    assert [c[1] for c in copia.categorias()] == ["Quesos", "Yogures"]
+
+
+def test_refresco_incremental_solo_los_marcados(origen, copia):
+    conn, _ = origen
+    conn.execute("UPDATE PRODUCTO SET NOMBRE = 'Queso fresco light' WHERE IDPRODUCTO = 1")
+    conn.execute("UPDATE PRODUCTO SET NOMBRE = 'Queso maduro añejo' WHERE IDPRODUCTO = 2")
+    conn.execute("""
+        INSERT INTO PRODUCTO (IDPRODUCTO, NOMBRE, DESCRIPCION, IDCATEGORIA, IDUNIDAD, CANTIDAD, ACTIVO)
+        VALUES (4, 'Yogur griego', '', 2, 1, 5, 1)
+    """)
+    conn.commit()
+    copia.marcar_cambio(1)
+    copia.marcar_cambio(4)
+    assert not copia.al_dia()
+    copia.refrescar()
+    assert copia.al_dia()
+    # El 2 no se marcó: sigue como estaba hasta la próxima copia completa
+    assert nombres(copia) == {1: "Queso fresco light", 2: "Queso maduro", 3: "Yogur natural", 4: "Yogur griego"}
+    copia.refrescar(completo=True)
+    assert nombres(copia)[2] == "Queso maduro añejo"
+
+
+def test_refresco_quita_eliminados(origen, copia):
+    conn, _ = origen
+    conn.execute("UPDATE PRODUCTO SET FECHAELIMINACION = datetime('now') WHERE IDPRODUCTO = 1")
+    conn.execute("DELETE FROM PRODUCTO WHERE IDPRODUCTO = 3")
+    conn.commit()
+    copia.marcar_cambio(1)
+    copia.marcar_cambio(3)
+    copia.refrescar()
+    assert nombres(copia) == {2: "Queso maduro"}
+
+
+def test_copia_fallida_deja_los_cambios_pendientes(origen, copia, monkeypatch):
+    conn, backend = origen
+    conn.execute("UPDATE PRODUCTO SET NOMBRE = 'Queso azul' WHERE IDPRODUCTO = 2")
+    conn.commit()
+
+    def sin_conexion():
+        raise sqlite3.OperationalError("unable to open database file")
+    monkeypatch.setattr(copia, "obtener_conexion", sin_conexion)
+    copia.marcar_cambio(2)
+    with pytest.raises(sqlite3.OperationalError):
+        copia.refrescar()
+    assert not copia.al_dia()
+    assert copia.resumen()["pendientes"] == 1
+    assert "unable to open" in copia.resumen()["ultimo_error"]
+    # Las lecturas siguen sirviendo la copia anterior
+    assert nombres(copia)[2] == "Queso maduro"
+
+    monkeypatch.setattr(copia, "obtener_conexion", backend.conectar)
+    copia.refrescar()
+    assert copia.al_dia()
+    assert nombres(copia)[2] == "Queso azul"
+    assert copia.resumen()["ultimo_error"] is None
+
+
+def test_copia_completa_fallida_se_repite(origen, copia, monkeypatch):
+    _, backend = origen
+
+    def sin_conexion():
+        raise sqlite3.OperationalError("unable to open database file")
+    monkeypatch.setattr(copia, "obtener_conexion", sin_conexion)
+    copia.marcar_cambio(None)
+    with pytest.raises(sqlite3.OperationalError):
+        copia.refrescar()
+    assert copia.resumen()["completo_pendiente"]
+    monkeypatch.setattr(copia, "obtener_conexion", backend.conectar)
+    copia.refrescar()
+    assert copia.al_dia()
+
+
+# --- leer_catalogo: respaldo en la copia local ---
+
+def test_leer_catalogo_usa_la_copia_si_la_bd_falla(app_mod, copia, monkeypatch):
+    monkeypatch.setattr(app_mod, "catalogo_local", copia)
+
+    def bd_caida():
+        raise sqlite3.OperationalError("unable to open database file")
+    with app_mod.app.test_request_context('/'):
+        datos = app_mod.leer_catalogo("prueba-copia", bd_caida, copia.categorias)
+        assert [c[1] for c in datos] == ["Quesos", "Yogures"]
+        assert app_mod.g.modo_degradado
+
+
+def test_leer_catalogo_con_circuito_abierto(app_mod, copia, monkeypatch):
+    monkeypatch.setattr(app_mod, "catalogo_local", copia)
+
+    def circuito_abierto():
+        raise app_mod.CircuitoAbierto("Base de datos no disponible (circuito abierto)")
+    with app_mod.app.test_request_context('/'):
+        assert app_mod.leer_catalogo("prueba-copia", circuito_abierto, copia.categorias)
+        assert app_mod.g.modo_degradado
+
+
+def test_leer_catalogo_sin_copia_usa_la_ultima_lectura(app_mod, monkeypatch):
+    monkeypatch.setattr(app_mod, "catalogo_local", None)
+    monkeypatch.setattr(app_mod, "_ultimas_lecturas", app_mod.OrderedDict())
+
+    def bd_arriba():
+        return [(1, "Quesos")]
+
+    def bd_caida():
+        raise sqlite3.OperationalError("unable to open database file")
+    with app_mod.app.test_request_context('/'):
+        assert app_mod.leer_catalogo("prueba-guardada", bd_arriba, None) == [(1, "Quesos")]
+        assert not app_mod.g.get("modo_degradado")
+    with app_mod.app.test_request_context('/'):
+        assert app_mod.leer_catalogo("prueba-guardada", bd_caida, None) == [(1, "Quesos")]
+        assert app_mod.g.modo_degradado
+    with app_mod.app.test_request_context('/'):
+        with pytest.raises(sqlite3.OperationalError):
+            app_mod.leer_catalogo("otra-clave", bd_caida, None)
@@ -0,0 +1,45 @@
+import sqlite3
+
+from migrar import a_sqlite, crear_bd_local, sentencias
+
+
+def test_a_sqlite_tipos():
+    ddl = a_sqlite("""CREATE TABLE T (
+        ID NUMBER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        PRECIO NUMBER(10,2),
+        ACTIVO NUMBER(1),
+        STOCK NUMBER,
+        NOMBRE VARCHAR2(100),
+        CUERPO CLOB,
+        FECHA TIMESTAMP DEFAULT SYSTIMESTAMP
+    )""")
+    assert "ID INTEGER PRIMARY KEY AUTOINCREMENT" in ddl
+    assert "PRECIO NUMERIC" in ddl
+    assert "ACTIVO INTEGER" in ddl
+    assert "STOCK INTEGER" in ddl
+    assert "NOMBRE VARCHAR(100)" in ddl
+    assert "CUERPO TEXT" in ddl
+    assert "DEFAULT (datetime('now', 'localtime'))" in ddl
+    sqlite3.connect(":memory:").execute(ddl)
+
+
+def test_a_sqlite_alter_add():
+    assert a_sqlite("ALTER TABLE T ADD (COL NUMBER(1) DEFAULT 0)") == \
+        "ALTER TABLE T ADD COLUMN COL INTEGER DEFAULT 0"
+
+
+def test_sentencias_sin_comentarios():
+    assert sentencias("-- nota\nSELECT 1 FROM DUAL; -- fin\n\nSELECT 2 FROM DUAL;") == \
+        ["SELECT 1 FROM DUAL", "SELECT 2 FROM DUAL"]
+
+
+def test_crear_bd_local_es_repetible(tmp_path):
+    ruta = str(tmp_path / "local.sqlite3")
+    conn, hechas = crear_bd_local(ruta)
+    conn.close()
+    assert hechas and hechas[0][0] == 0
+    conn, hechas = crear_bd_local(ruta)
+    tablas = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    conn.close()
+    assert hechas == []
+    assert {"PRODUCTO", "ENVIOCORREO", "CHATBOTCONSULTA", "SCHEMA_VERSION"} <= tablas
@@ -0,0 +1,43 @@
+import threading
+import time
+
+from perfilador import Perfilador, forma_binds
+
+
+def esperar_plan(perfilador, clave, segundos=2):
+    limite = time.monotonic() + segundos
+    while clave not in perfilador.planes and time.monotonic() < limite:
+        time.sleep(0.01)
+    return perfilador.planes.get(clave)
+
+
+def test_forma_binds_no_expone_valores():
+    assert forma_binds({"nombre": "queso", "id": 3}) == "{nombre: str(5), id: int}"
+    assert forma_binds(["abc", 1.5]) == "[str(3), float]"
+
+
+def test_plan_en_segundo_plano_con_binds():
+    llamadas = []
+    liberar = threading.Event()
+
+    def explicar(sql, params):
+        liberar.wait(2)
+        llamadas.append((sql, params, threading.current_thread().name))
+        return ["PLAN"]
+
+    perfilador = Perfilador(umbral_ms=0, explicar=explicar)
+    sql = "SELECT * FROM PRODUCTO WHERE IDPRODUCTO = :1"
+    perfilador.registrar(sql, [7], 5, 1, 1)
+    # La petición no espera el plan y una segunda medición no lo vuelve a encargar
+    assert perfilador.lentas[-1]["plan"] is None
+    perfilador.registrar(sql, [8], 5, 1, 1)
+    liberar.set()
+    assert esperar_plan(perfilador, sql) == ["PLAN"]
+    assert llamadas == [(sql, [7], "planes-sql")]
+    assert perfilador.resumen()["lentas"][0]["plan"] == ["PLAN"]
+
+
+def test_plan_solo_para_consultas():
+    perfilador = Perfilador(umbral_ms=0, explicar=lambda sql, params: ["PLAN"])
+    perfilador.registrar("UPDATE PRODUCTO SET CANTIDAD = 0", None, 5, 0, 1)
+    assert perfilador.planes == {} and perfilador._hilo_planes is None